@@ -1,47 +1,153 @@
+import argparse
+import csv
+import io
 import json
+import math
 import random
+import sys
+from multiprocessing import Pool
 from faker import Faker
 
-# Initialize the Faker generator
-fake = Faker()
-
 races = ['White', 'Black or African American', 'Asian', 'Native American', 'Pacific Islander', 'Other']
 
+FIELDS = ["name", "ssn", "phone_number", "address", "dob", "height", "race"]
+FORMATS = ["json", "jsonl", "csv"]
+CHUNK_SIZE = 10000
+
+# SSNs are drawn from the valid ranges: area 001-899 except 666, group 01-99, serial 0001-9999
+SSN_AREAS = [area for area in range(1, 900) if area != 666]
+SSN_SPACE = len(SSN_AREAS) * 99 * 9999
+
 # Function to generate a formatted phone number
-def generate_phone_number():
+def generate_phone_number(rng=random):
     '''
     Generate a random phone number in XXX-XXX-XXXX format
     '''
-    area_code = random.randint(100, 999)
-    first_part = random.randint(100, 999)
-    second_part = random.randint(1000, 9999)
+    area_code = rng.randint(100, 999)
+    first_part = rng.randint(100, 999)
+    second_part = rng.randint(1000, 9999)
     return f"{area_code}-{first_part}-{second_part}"
 
 # Function to generate a random height in feet and inches
-def generate_height():
-    feet = random.randint(4, 6)
-    inches = random.randint(0, 11) 
+def generate_height(rng=random):
+    feet = rng.randint(4, 6)
+    inches = rng.randint(0, 11)
     return f"{feet}'{inches}"
 
-individuals = []
+def ssn_multiplier(seed):
+    '''
+    Pick a multiplier coprime with SSN_SPACE so that i -> i * multiplier mod SSN_SPACE
+    visits every SSN exactly once
+    '''
+    rng = random.Random(seed)
+    while True:
+        multiplier = rng.randrange(1, SSN_SPACE)
+        if math.gcd(multiplier, SSN_SPACE) == 1:
+            return multiplier, rng.randrange(SSN_SPACE)
 
-for _ in range(1000):
+def generate_ssn(index, multiplier, offset):
     '''
-    Generate 100 individuals with formatted SSNs, consistent phone numbers, and additional fields
+    Return the SSN for the index-th individual. Different indexes always give
+    different SSNs, so workers never need to coordinate to stay unique.
     '''
-    individual = {
+    value = (index * multiplier + offset) % SSN_SPACE
+    value, serial = divmod(value, 9999)
+    area, group = divmod(value, 99)
+    return f"{SSN_AREAS[area]:03d}-{group + 1:02d}-{serial + 1:04d}"
+
+def generate_individual(fake, rng, ssn):
+    '''
+    Generate one individual with a formatted SSN, consistent phone number, and additional fields
+    '''
+    return {
         "name": fake.name(),
-        "ssn": fake.ssn(),
-        "phone_number": generate_phone_number(), 
-        "address": fake.address().replace("\n", ", "), 
+        "ssn": ssn,
+        "phone_number": generate_phone_number(rng),
+        "address": fake.address().replace("\n", ", "),
         "dob": str(fake.date_of_birth(minimum_age=18, maximum_age=90)),
-        "height": generate_height(),
-        "race": fake.random_element(races) 
+        "height": generate_height(rng),
+        "race": rng.choice(races)
     }
-    individuals.append(individual)
 
-# Convert the list to JSON
-individuals_json = json.dumps(individuals, indent=4)
+def format_individual(individual, output_format):
+    if output_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow([individual[field] for field in FIELDS])
+        return buffer.getvalue()
+    return json.dumps(individual) + "\n"
+
+# Faker instance reused by every chunk a worker process generates
+worker_fake = None
+
+def generate_chunk(task):
+    '''
+    Generate individuals start..end as one block of output text. Each chunk is seeded
+    from the run seed and its position, so the output is the same for any number of workers.
+    '''
+    global worker_fake
+    seed, start, end, output_format = task
+    if worker_fake is None:
+        worker_fake = Faker()
+    chunk_seed = seed * 1000003 + start // CHUNK_SIZE
+    worker_fake.seed_instance(chunk_seed)
+    rng = random.Random(chunk_seed)
+    multiplier, offset = ssn_multiplier(seed)
+
+    lines = []
+    for index in range(start, end):
+        individual = generate_individual(worker_fake, rng, generate_ssn(index, multiplier, offset))
+        lines.append(format_individual(individual, output_format))
+    return "".join(lines)
+
+def write_individuals(f, count, seed, output_format, workers):
+    '''
+    Stream count individuals to f, CHUNK_SIZE at a time, using a pool of worker processes if asked
+    '''
+    tasks = [(seed, start, min(start + CHUNK_SIZE, count), output_format) for start in range(0, count, CHUNK_SIZE)]
+    if output_format == "csv":
+        f.write(",".join(FIELDS) + "\n")
+    elif output_format == "json":
+        f.write("[")
+
+    first = True
+    def write_chunk(text):
+        nonlocal first
+        if output_format == "json" and text:
+            # Same layout as the app's snapshot files: one person per line inside a list
+            text = ",\n    ".join(text.rstrip("\n").split("\n"))
+            f.write(("\n    " if first else ",\n    ") + text)
+            first = False
+        else:
+            f.write(text)
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            for text in pool.imap(generate_chunk, tasks):
+                write_chunk(text)
+    else:
+        for task in tasks:
+            write_chunk(generate_chunk(task))
+
+    if output_format == "json":
+        f.write("\n]\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate fake individuals for the Identity Manager.")
+    parser.add_argument("--count", type=int, default=1000, help="number of individuals to generate (default 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for reproducible output (default 0)")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="output format (default json)")
+    parser.add_argument("--output", default="Individuals' Data.json", help="file to write, or - for stdout")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to split the generation across")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.count <= SSN_SPACE:
+        parser.error(f"--count must be between 0 and {SSN_SPACE} so every SSN can be unique")
+
+    if args.output == "-":
+        write_individuals(sys.stdout, args.count, args.seed, args.format, args.workers)
+    else:
+        with open(args.output, "w", newline="") as f:
+            write_individuals(f, args.count, args.seed, args.format, args.workers)
 
-with open("Individuals' Data.json", "w") as f:
-    f.write(individuals_json)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,80 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
+from tkinter import ttk, filedialog, messagebox
+import gc
 import os
-import re
-import sys
-
-# Function to get the correct base directory in both development and packaged executable environments
-def get_base_dir():
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    else:
-        return os.path.dirname(os.path.abspath(__file__))
-
-BASE_DIR = get_base_dir()
-DATA_FILE = os.path.join(BASE_DIR, "Individuals' Data.json")
-
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
-def is_valid_phone_number(phone):
-    """
-    Check if the phone number is valid (in the format XXX-XXX-XXXX).
-    """
-    return re.match(r"^\d{3}-\d{3}-\d{4}$", phone) is not None
-
-def is_valid_input(text, allow_commas=False, allow_apostrophe=False):
-    """
-    Check if the text contains only valid characters:
-    - No special characters
-    - Allow spaces, hyphens, and apostrophes (only for name and race).
-    """
-    if allow_commas and allow_apostrophe:
-        return re.match(r"^[A-Za-z0-9 \-,']+$", text) is not None  
-    elif allow_commas:
-        return re.match(r"^[A-Za-z0-9 \-,]+$", text) is not None  # Allow commas, no apostrophes
-    elif allow_apostrophe:
-        return re.match(r"^[A-Za-z0-9 \-']+$", text) is not None  # Allow apostrophes and hyphens
-    else:
-        # Default case: no special characters at all
-        return re.match(r"^[A-Za-z0-9 \-]+$", text) is not None  # Only letters, numbers, spaces, hyphens
-
-
-def auto_format_ssn(ssn):
-    """
-    Automatically format a 9-digit SSN into XXX-XX-XXXX format.
-    """
-    ssn_clean = ssn.replace(" ", "").replace("-", "")
-    if len(ssn_clean) == 9 and ssn_clean.isdigit():
-        return f"{ssn_clean[:3]}-{ssn_clean[3:5]}-{ssn_clean[5:]}"
-    return ssn
-
-def is_valid_ssn(ssn):
-    return re.match(r"^[0-9 -]+$", ssn) is not None
-
+import queue
+import threading
+import time
+import profiling
+from aggregates import export_report, report_format
+from storage import DATA_FILE, ConflictError, open_storage
+from indexed_store import SORT_KEYS, build_indexed_store
+from search import ResultCache, SearchJob, in_ranges, matches, split_criteria
+from virtual_table import OrderedRows, VirtualTable
+from validation import PERSON_FIELDS, ValidationError, auto_format_ssn, validate_person
+
+# The trigram index makes substring searches fast at the cost of extra memory per person
+USE_TRIGRAM_INDEX = True
+
+# Index name words by sound and spelling so Find can tolerate misspelled names
+USE_FUZZY_NAME_INDEX = True
+
+# Keep people sorted by DOB and height for range searches and instant sorting of those columns
+USE_ORDERED_INDEXES = True
+
+# Keep people in packed columns instead of one dict each; uses far less memory on large datasets
+COMPACT_RECORDS = False
+
+# Adds and removes are appended to a journal next to DATA_FILE and compacted in the background.
+# The format follows the extension: .json for JSON, .idb for the binary snapshot, .sqlite for SQLite,
+# .enc for encrypted chunks (the key is read from the IDENTITY_MANAGER_KEY environment variable).
+storage = open_storage(DATA_FILE)
+
+# How often the GUI picks up batches from the background loader, and how long it may spend per tick.
+# Batches are added to the store a slice of people at a time, checking the time in between,
+# as adding a whole batch with every index attached takes several ticks' worth.
+LOAD_POLL_MS = 50
+LOAD_SLICE_SECONDS = 0.05
+LOAD_SLICE_PEOPLE = 250
+
+# How often the GUI collects matches from a running search
+SEARCH_POLL_MS = 50
+
+# How often the statistics screen is redrawn while people are still loading
+STATISTICS_REFRESH_SECONDS = 1.0
+
+# How long typing in the Find form has to pause before the results below it are updated
+LIVE_SEARCH_DELAY_MS = 250
+
+# Several windows can share DATA_FILE. Each checks this often for people the others added
+# or removed, and retries a change this many times when another window writes first.
+CHANGE_POLL_MS = 1000
+WRITE_ATTEMPTS = 3
+
+# Tabs of the statistics screen: section of the Aggregates report and the column heading for its values
+STATISTICS_TABS = (("race", "Race"), ("age", "Age"), ("height", "Height"), ("state", "State"))
+STATISTICS_COLUMNS = ("People", "Share")
+
+COLUMNS = ("Name", "SSN", "Phone Number", "Address", "DOB", "Height", "Race")
+COLUMN_FIELDS = dict(zip(COLUMNS, PERSON_FIELDS))
+
+# Columns compared as parsed values rather than strings when sorting
+def sort_key_for(field):
+    if field in SORT_KEYS:
+        return SORT_KEYS[field]
+    return lambda person: str(person.get(field, "")).lower()
+
+def person_row(person):
+    """Return a person's values in table column order."""
+    return (
+        person.get("name", ""),
+        person.get("ssn", ""),
+        person.get("phone_number", ""),
+        person.get("address", ""),
+        person.get("dob", ""),
+        person.get("height", ""),
+        person.get("race", "")
+    )
 
 # Tooltip function
 def create_tooltip(widget, text, app):
@@ -123,7 +135,12 @@ class IdentityManagerApp:
 
         self.root.configure(bg=self.light_bg)  
         self.is_dark_mode = False  
-        self.data = load_data()
+        self.build_store([])
+        self.loading = True
+        self.current_table = None
+        self.live_table = None
+        self.statistics_tables = None
+        self.search_job = None
         self.style = ttk.Style()
         self.style.theme_use('clam')  
         self.style.configure('TFrame', background=self.light_bg)
@@ -132,6 +149,112 @@ class IdentityManagerApp:
         self.style.configure('Treeview', font=('Helvetica', 10))
         self.current_frame = None
         self.main_menu()  
+        self.start_loading()
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+
+    def build_store(self, records):
+        """Load records into a fresh RecordStore and attach the search indexes."""
+        store = build_indexed_store(records, trigram=USE_TRIGRAM_INDEX, fuzzy=USE_FUZZY_NAME_INDEX,
+                                    ordered=USE_ORDERED_INDEXES, compact=COMPACT_RECORDS)
+        self.data = store.data
+        self.search_index = store.search_index
+        self.name_index = store.name_index
+        self.ordered_indexes = store.ordered_indexes
+        self.search_cache = store.search_cache
+        self.aggregates = store.aggregates
+
+    def start_loading(self):
+        """
+        Read people from disk on a background thread and hand them to the GUI in batches,
+        so the main menu can be used while a large file is still loading.
+        """
+        self.load_progress = 0.0
+        self.load_queue = queue.Queue()
+        self.load_batch = None   # batch being added, and how far into it
+        self.load_offset = 0
+        self.load_span = profiling.start("load")
+
+        self.status_bar = ttk.Frame(self.root)
+        self.status_bar.place(relx=0.0, rely=1.0, anchor='sw', x=20, y=-20)
+        self.progress_bar = ttk.Progressbar(self.status_bar, length=200, maximum=1.0)
+        self.progress_bar.pack(side=tk.LEFT)
+        self.status_label = ttk.Label(self.status_bar, text="Loading people...", font=('Helvetica', 10))
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+        threading.Thread(target=self.load_in_background, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self.poll_loading)
+
+    def load_in_background(self):
+        """Runs on the loader thread; never touches Tk widgets."""
+        try:
+            for batch in storage.stream(on_progress=self.on_load_progress):
+                self.load_queue.put(batch)
+        except Exception as e:
+            # Whatever went wrong, the GUI must hear about it rather than wait for more batches
+            self.load_queue.put(e)
+            return
+        self.load_queue.put(None)
+
+    def on_load_progress(self, fraction):
+        self.load_progress = fraction
+
+    def poll_loading(self):
+        """Add the batches read so far to the store without blocking the GUI for long."""
+        deadline = time.monotonic() + LOAD_SLICE_SECONDS
+        while time.monotonic() < deadline:
+            if self.load_batch is None:
+                try:
+                    batch = self.load_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    self.finish_loading()
+                    return
+                if isinstance(batch, Exception):
+                    # Refuse to go on rather than treating a damaged file as an empty dataset
+                    messagebox.showerror("Error", f"Could not load data: {batch}")
+                    self.root.destroy()
+                    return
+                self.load_batch = batch
+                self.load_offset = 0
+            end = self.load_offset + LOAD_SLICE_PEOPLE
+            self.data.extend(self.load_batch[self.load_offset:end])
+            self.load_offset = end
+            if end >= len(self.load_batch):
+                self.load_batch = None
+        # Move the people loaded so far out of the garbage collector's sight. Otherwise its full
+        # collections, which go through every object, stall the GUI for up to a second at a time.
+        gc.freeze()
+
+        self.progress_bar["value"] = self.load_progress
+        self.status_label.config(text=f"Loading people... {len(self.data)} so far")
+        if self.current_table is not None:
+            self.current_table.refresh()
+        self.update_statistics(force=False)
+        self.root.after(LOAD_POLL_MS, self.poll_loading)
+
+    def finish_loading(self):
+        self.load_span.stop(people=len(self.data))
+        self.loading = False
+        self.status_bar.destroy()
+        for button in self.data_buttons:
+            if button.winfo_exists():
+                button.configure(state=tk.NORMAL)
+        if self.current_table is not None:
+            self.current_table.refresh()
+        self.update_statistics()
+        # Live results so far only covered part of the file
+        self.rerun_live_search()
+        self.warn_about_duplicates()
+
+    def warn_about_duplicates(self):
+        """Tell the user about records on disk that were skipped because their SSN repeats."""
+        if self.data.duplicates:
+            messagebox.showwarning(
+                "Duplicate SSNs",
+                f"{len(self.data.duplicates)} record(s) in the data file repeat an SSN that is already loaded "
+                "and were not loaded."
+            )
 
     def toggle_theme(self):
         """Switch between dark and light mode."""
@@ -154,11 +277,14 @@ class IdentityManagerApp:
     def clear_frame(self):
         if self.current_frame is not None:
             self.current_frame.destroy()
+        self.current_table = None
+        self.statistics_tables = None
 
     def main_menu(self):
         """
         Display the main menu with options to add, remove, find, and list people.
         """
+        self.cancel_search()
         self.clear_frame()
         self.current_frame = ttk.Frame(self.root, padding="20")
         self.current_frame.pack(fill=tk.BOTH, expand=True)
@@ -166,11 +292,15 @@ class IdentityManagerApp:
         title = ttk.Label(self.current_frame, text="Identity Manager", font=("Helvetica", 20, "bold"))
         title.pack(pady=20)
 
-        btn_add = ttk.Button(self.current_frame, text="Add a Person", command=self.add_person, width=30)
+        # Adding and removing need every SSN loaded to check for duplicates, so wait for the loader
+        data_state = tk.DISABLED if self.loading else tk.NORMAL
+
+        btn_add = ttk.Button(self.current_frame, text="Add a Person", command=self.add_person, width=30, state=data_state)
         btn_add.pack(pady=10)
 
-        btn_remove = ttk.Button(self.current_frame, text="Remove a Person", command=self.remove_person, width=30)
+        btn_remove = ttk.Button(self.current_frame, text="Remove a Person", command=self.remove_person, width=30, state=data_state)
         btn_remove.pack(pady=10)
+        self.data_buttons = [btn_add, btn_remove]
 
         btn_find = ttk.Button(self.current_frame, text="Find a Person", command=self.find_person, width=30)
         btn_find.pack(pady=10)
@@ -178,6 +308,9 @@ class IdentityManagerApp:
         btn_show_all = ttk.Button(self.current_frame, text="Show All People", command=self.show_all_people, width=30)
         btn_show_all.pack(pady=10)
 
+        btn_statistics = ttk.Button(self.current_frame, text="Statistics", command=self.show_statistics, width=30)
+        btn_statistics.pack(pady=10)
+
         self.create_toggle_button()  
 
     def go_back(self):
@@ -240,70 +373,25 @@ class IdentityManagerApp:
             "race": self.entries["race"].get().strip()
         }
 
-        # Validate all fields
-        if not all(new_person.values()):
-            messagebox.showerror("Error", "All fields are required.")
-            return
-        
-        if not is_valid_ssn(new_person["ssn"]):
-            messagebox.showerror("Error", "Invalid SSN. Only digits, spaces, and dashes are allowed.")
-            return
-
-        # Validate SSN: ensure only digits, spaces, and dashes
-        new_person["ssn"] = auto_format_ssn(new_person["ssn"])
-        if len(new_person["ssn"]) != 11:
-            messagebox.showerror("Error", "Invalid SSN format. Use XXX-XX-XXXX or provide 9 digits.")
-            return
-
-        # Validate Phone Number
-        new_person["phone_number"] = new_person["phone_number"].replace(" ", "").replace("-", "")
-        if len(new_person["phone_number"]) == 10 and new_person["phone_number"].isdigit():
-            new_person["phone_number"] = f"{new_person['phone_number'][:3]}-{new_person['phone_number'][3:6]}-{new_person['phone_number'][6:]}"
-        else:
-            messagebox.showerror("Error", "Invalid Phone Number format. Use XXX-XXX-XXXX or provide 10 digits.")
-            return
-
-        # Validate Date of Birth format (YYYY-MM-DD)
-        dob_pattern = r"^\d{4}-\d{2}-\d{2}$"
-        if not re.match(dob_pattern, new_person["dob"]):
-            messagebox.showerror("Error", "Invalid Date of Birth format. Use YYYY-MM-DD.")
-            return
-
-        # Validate Height format (X'Y")
-        height_pattern = r"^\d{1,2}'\d{1,2}$"
-        if not re.match(height_pattern, new_person["height"]):
-            messagebox.showerror("Error", "Invalid Height format. Use X'Y\" (e.g., 5'11).")
-            return
-
-        # Check Address for special characters
-        if not is_valid_input(new_person["address"], allow_commas=True):
-            messagebox.showerror("Error", "Invalid characters in Address.")
-            return
-        
-        # Name validation (no special characters)
-        if not is_valid_input(new_person["name"]):
-            messagebox.showerror("Error", "Invalid characters in Name. No special characters allowed.")
-            return
-
-        # Race validation (no special characters)
-        if not is_valid_input(new_person["race"]):
-            messagebox.showerror("Error", "Invalid characters in Race. No special characters allowed.")
-            return
-
-        # Validate the height apostrophe character
-        if not is_valid_input(new_person["height"], allow_apostrophe=True):
-            messagebox.showerror("Error", "Invalid characters in Height.")
-            return
-
-        # Check for duplicate SSN
-        if any(person["ssn"] == new_person["ssn"] for person in self.data):
-            messagebox.showerror("Error", "SSN already exists.")
-            return
+        with profiling.span("add person") as timing:
+            try:
+                new_person = validate_person(new_person)
+            except ValidationError as e:
+                timing.stop(error="invalid")
+                messagebox.showerror("Error", str(e))
+                return
 
-        # Add to data and save
-        self.data.append(new_person)
-        save_data(self.data)
-        self.refresh_data()
+            # Check for duplicate SSN, including people other windows just added,
+            # and record the change in the journal before adding it to data
+            error = self.write_change(
+                lambda: "SSN already exists." if new_person["ssn"] in self.data else None,
+                lambda version: storage.add(new_person, expected_version=version)
+            )
+            if error:
+                timing.stop(error=error)
+                messagebox.showerror("Error", error)
+                return
+            self.data.add(new_person)
         messagebox.showinfo("Success", "Person added successfully.")
         self.go_back()
 
@@ -341,18 +429,25 @@ class IdentityManagerApp:
             messagebox.showerror("Error", "Invalid SSN format. Use XXX-XX-XXXX.")
             return
 
-        for person in self.data:
-            if person["ssn"] == ssn_formatted:
-                confirm = messagebox.askyesno("Confirm Removal", f"Are you sure you want to remove {person['name']}?")
-                if confirm:
-                    self.data.remove(person)
-                    save_data(self.data)
-                    self.refresh_data()
-                    messagebox.showinfo("Success", "Person removed successfully.")
-                    self.go_back()
-                return
+        person = self.data.get(ssn_formatted)
+        if person is None:
+            messagebox.showerror("Error", "Person with the given SSN not found.")
+            return
 
-        messagebox.showerror("Error", "Person with the given SSN not found.")
+        confirm = messagebox.askyesno("Confirm Removal", f"Are you sure you want to remove {person['name']}?")
+        if confirm:
+            with profiling.span("remove person") as timing:
+                error = self.write_change(
+                    lambda: None if person["ssn"] in self.data else "Person with the given SSN not found.",
+                    lambda version: storage.remove(person["ssn"], expected_version=version)
+                )
+                if error:
+                    timing.stop(error=error)
+                    messagebox.showerror("Error", error)
+                    return
+                self.data.remove(person["ssn"])
+            messagebox.showinfo("Success", "Person removed successfully.")
+            self.go_back()
 
     def find_person(self):
         """
@@ -373,20 +468,46 @@ class IdentityManagerApp:
         self.entries_find = {}
         for idx, field in enumerate(fields, start=1):
             label = ttk.Label(frame, text=f"{field}:", font=('Helvetica', 12))
-            label.grid(row=idx, column=1, padx=10, pady=5, sticky=tk.E)
+            label.grid(row=idx, column=1, padx=10, pady=2, sticky=tk.E)
             entry = ttk.Entry(frame, width=40)
-            entry.grid(row=idx, column=2, padx=10, pady=5, sticky=tk.W)
+            entry.grid(row=idx, column=2, padx=10, pady=2, sticky=tk.W)
+            # Results below the form follow what is typed
+            entry.bind("<KeyRelease>", self.schedule_live_search)
             self.entries_find[field.lower().replace(" ", "_")] = entry
 
+        hint = ttk.Label(frame, text="DOB and Height also take ranges, e.g. 1970..1980, >6'0 or <=1950-06",
+                         font=('Helvetica', 9))
+        hint.grid(row=len(fields) + 1, column=1, columnspan=2, pady=(0, 5))
+
+        self.fuzzy_name = tk.BooleanVar(value=False)
+        check_fuzzy = ttk.Checkbutton(frame, text="Match misspelled names (closest first)", variable=self.fuzzy_name,
+                                      command=self.schedule_live_search)
+        check_fuzzy.grid(row=len(fields) + 2, column=2, padx=10, sticky=tk.W)
+        if self.name_index is None:
+            check_fuzzy.configure(state=tk.DISABLED)
+
         btn_find = ttk.Button(frame, text="Find", command=self.search_person)
-        btn_find.grid(row=len(fields) + 1, column=1, columnspan=2, pady=20)
+        btn_find.grid(row=len(fields) + 3, column=1, pady=10, sticky=tk.E)
 
         btn_back = ttk.Button(frame, text="Go Back", command=self.go_back)
-        btn_back.grid(row=len(fields) + 2, column=1, columnspan=2, pady=10)
+        btn_back.grid(row=len(fields) + 3, column=2, pady=10, sticky=tk.W)
+
+        self.find_status = ttk.Label(frame, text="", font=('Helvetica', 10))
+        self.find_status.grid(row=len(fields) + 4, column=1, columnspan=2)
+
+        table = VirtualTable(frame, COLUMNS, [], person_row)
+        table.grid(row=len(fields) + 5, column=0, columnspan=4, sticky=tk.NSEW)
+        frame.grid_rowconfigure(len(fields) + 5, weight=1)
+        self.current_table = table
+        self.live_table = table
+        self.table_rows = []
+        self.live_after = None
+        self.live_query = None
 
     def search_person(self):
         """
         Search the system for people matching the entered criteria.
+        The search runs on a worker thread; a new search cancels the one still running.
         """
         criteria = {field: entry.get().strip() for field, entry in self.entries_find.items()}
 
@@ -394,110 +515,396 @@ class IdentityManagerApp:
             messagebox.showerror("Error", "At least one search criterion is required.")
             return
 
-        results = []
-        for person in self.data:
-            match = True
-            for key, value in criteria.items():
-                if value:
-                    person_value = person.get(key, "").lower()
-                    search_value = value.lower()
-                    if key == "ssn":
-                        person_value = person_value.replace("-", "")
-                        search_value = search_value.replace("-", "")
-                    if search_value not in person_value:
-                        match = False
-                        break
-            if match:
-                results.append(person)
+        try:
+            split_criteria(criteria)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid range: {e}")
+            return
+
+        self.cancel_search()
+        if self.fuzzy_name.get() and criteria["name"]:
+            self.fuzzy_search(criteria)
+            return
+
+        # The live results may already have found everyone
+        terms, ranges = split_criteria(criteria)
+        cached = self.search_cache.get(terms, ranges)
+        if cached is not None:
+            if cached:
+                self.show_search_results(cached)
+            else:
+                messagebox.showinfo("No Results", "No matching records found.")
+            return
+
+        self.search_span = profiling.start("search", fields=sorted(key for key, value in criteria.items() if value))
+        job = SearchJob(self.data, criteria, self.search_index, self.ordered_indexes)
+        self.search_job = job
+        self.search_generation = self.search_cache.generation
+        self.search_results = []
+        self.search_showing = False
+        job.start()
+        self.root.after(SEARCH_POLL_MS, self.poll_search, job)
+
+    def schedule_live_search(self, event=None):
+        """Search again once typing pauses for LIVE_SEARCH_DELAY_MS, not on every key."""
+        if self.live_after is not None:
+            self.root.after_cancel(self.live_after)
+        self.live_after = self.root.after(LIVE_SEARCH_DELAY_MS, self.live_search)
+
+    def live_search(self):
+        """
+        Update the results below the Find form. Cached results are shown straight away;
+        a query that narrows a cached one (more characters typed) only filters those results.
+        """
+        self.live_after = None
+        if not self.find_status.winfo_exists():
+            return
+        criteria = {field: entry.get().strip() for field, entry in self.entries_find.items()}
+        fuzzy = self.fuzzy_name.get() and bool(criteria["name"])
+        try:
+            terms, ranges = split_criteria(criteria)
+        except ValueError as e:
+            self.find_status.config(text=f"Invalid range: {e}")
+            return
+
+        # Keys that do not change the text (arrows, Tab) do not search again
+        query = (fuzzy, ResultCache.key(terms, ranges))
+        if query == self.live_query:
+            return
+        self.live_query = query
+        self.cancel_search()
+
+        if not terms and not ranges:
+            self.show_live_results([], "")
+            return
+        if fuzzy:
+            with profiling.span("fuzzy search", live=True):
+                results = self.fuzzy_matches(criteria)
+            self.show_live_results(results, f"{len(results)} found, closest names first")
+            return
+        cached = self.search_cache.get(terms, ranges)
+        if cached is not None:
+            self.show_live_results(cached, f"{len(cached)} found")
+            return
+
+        base = self.search_cache.narrowest(terms, ranges)
+        self.search_span = profiling.start("live search", fields=sorted(terms) + sorted(ranges),
+                                           narrowed=base is not None)
+        if base is None:
+            job = SearchJob(self.data, criteria, self.search_index, self.ordered_indexes)
+        else:
+            job = SearchJob(base, criteria)
+        self.search_job = job
+        self.search_generation = self.search_cache.generation
+        self.live_results = []
+        self.show_live_results(self.live_results, "Searching...")
+        job.start()
+        self.root.after(SEARCH_POLL_MS, self.poll_live_search, job)
+
+    def poll_live_search(self, job):
+        if job is not self.search_job:
+            return
+        done = job.drain(self.live_results)
+        if not done:
+            self.show_live_results(self.live_results,
+                                   f"Searching... {len(self.live_results)} found, {job.checked} people checked")
+            self.root.after(SEARCH_POLL_MS, self.poll_live_search, job)
+            return
+
+        self.search_job = None
+        self.search_span.stop(checked=job.checked, found=len(self.live_results))
+        self.cache_results(job, self.live_results)
+        status = f"{len(self.live_results)} found"
+        if self.loading:
+            status += f" among the {job.checked} people loaded so far"
+        self.show_live_results(self.live_results, status)
+
+    def rerun_live_search(self):
+        """Search again with the same query if the Find form is open, after the people changed."""
+        if self.current_table is not None and self.current_table is self.live_table:
+            self.live_query = None
+            self.schedule_live_search()
+
+    def show_live_results(self, results, status):
+        self.find_status.config(text=status)
+        self.table_rows = results
+        self.current_table.set_rows(results)
+
+    def cache_results(self, job, results):
+        """Keep a finished search's results unless people were added or removed while it ran, or it failed."""
+        if not job.failed and not self.loading and self.search_generation == self.search_cache.generation:
+            self.search_cache.put(job.terms, job.ranges, results)
+
+    def fuzzy_matches(self, criteria):
+        """
+        People whose name is close to the one entered, ranked by similarity.
+        The other fields still have to match exactly as in a normal search.
+        """
+        ranked = self.name_index.search(self.data, criteria["name"])
+        others, ranges = split_criteria({key: value for key, value in criteria.items() if key != "name"})
+        return [person for _, person in ranked if matches(person, others) and in_ranges(person, ranges)]
+
+    def fuzzy_search(self, criteria):
+        """Show the people whose name is close to the one entered, closest first."""
+        with profiling.span("fuzzy search"):
+            results = self.fuzzy_matches(criteria)
 
         if not results:
             messagebox.showinfo("No Results", "No matching records found.")
             return
+        self.show_search_results(results, "Search Results (closest names first)")
 
-        self.show_search_results(results)
+    def poll_search(self, job):
+        """Show the matches found so far; switch to the results screen once there are any."""
+        if job is not self.search_job:
+            return
+        done = job.drain(self.search_results)
 
-    def show_search_results(self, results):
-        self.clear_frame()
-        frame = ttk.Frame(self.root, padding="20")
-        frame.pack(fill=tk.BOTH, expand=True)
-        self.current_frame = frame
+        # While the file is still loading, searches cover the people loaded so far
+        if self.loading:
+            searched = f"the {job.checked} people loaded so far"
+            title_text = f"Search Results (still loading, searched {job.checked} people)"
+        else:
+            searched = None
+            title_text = "Search Results"
+
+        if done:
+            self.search_job = None
+            self.search_span.stop(checked=job.checked, found=len(self.search_results))
+            self.cache_results(job, self.search_results)
+            if not self.search_results:
+                if self.find_status.winfo_exists():
+                    self.find_status.config(text="")
+                if searched:
+                    messagebox.showinfo("No Results", f"No matching records found among {searched}.")
+                else:
+                    messagebox.showinfo("No Results", "No matching records found.")
+                return
+        else:
+            title_text = f"Searching... {len(self.search_results)} found, {job.checked} people checked"
 
-        title = ttk.Label(frame, text="Search Results", font=("Helvetica", 16, "bold"))
-        title.pack(pady=10)
+        if self.search_results and not self.search_showing:
+            self.show_search_results(self.search_results, title_text)
+            self.search_showing = True
+        elif self.search_showing:
+            self.current_title.config(text=title_text)
+            self.current_table.refresh()
+        elif self.find_status.winfo_exists():
+            self.find_status.config(text=f"Searching... {job.checked} people checked")
 
-        columns = ("Name", "SSN", "Phone Number", "Address", "DOB", "Height", "Race")
-        tree = ttk.Treeview(frame, columns=columns, show="headings")
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100, anchor=tk.W)
-
-        for person in results:
-            tree.insert("", tk.END, values=(
-                person.get("name", ""),
-                person.get("ssn", ""),
-                person.get("phone_number", ""),
-                person.get("address", ""),
-                person.get("dob", ""),
-                person.get("height", ""),
-                person.get("race", "")
-            ))
-
-        tree.pack(fill=tk.BOTH, expand=True, pady=10)
-
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        if not done:
+            self.root.after(SEARCH_POLL_MS, self.poll_search, job)
 
-        btn_back = ttk.Button(frame, text="Go Back", command=self.go_back)
-        btn_back.pack(pady=5)
+    def cancel_search(self):
+        if self.search_job is not None:
+            self.search_job.cancel()
+            self.search_job = None
+            self.search_span.stop(cancelled=True)
 
+    def show_search_results(self, results, title_text="Search Results"):
+        self.show_table(title_text, results)
 
     def show_all_people(self):
         """
         Show all people currently in the system.
         """
+        self.show_table("All People", self.data)
+
+    def show_statistics(self):
+        """
+        Show counts by race, age band, height and state. They are running totals kept as
+        people are added and removed, so opening this screen does not go through everyone.
+        """
+        self.cancel_search()
         self.clear_frame()
         frame = ttk.Frame(self.root, padding="20")
         frame.pack(fill=tk.BOTH, expand=True)
         self.current_frame = frame
 
-        title = ttk.Label(frame, text="All People", font=("Helvetica", 16, "bold"))
+        title = ttk.Label(frame, text="Statistics", font=("Helvetica", 16, "bold"))
         title.pack(pady=10)
+        self.statistics_total = ttk.Label(frame, text="", font=('Helvetica', 10))
+        self.statistics_total.pack()
+
+        notebook = ttk.Notebook(frame)
+        notebook.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.statistics_tables = {}
+        for section, heading in STATISTICS_TABS:
+            tab = ttk.Frame(notebook)
+            notebook.add(tab, text=heading)
+            table = VirtualTable(tab, (heading,) + STATISTICS_COLUMNS, [], self.statistics_row)
+            table.pack(fill=tk.BOTH, expand=True)
+            self.statistics_tables[section] = table
+
+        buttons = ttk.Frame(frame)
+        buttons.pack(pady=5)
+        btn_export = ttk.Button(buttons, text="Export...", command=self.export_statistics)
+        btn_export.pack(side=tk.LEFT, padx=5)
+        btn_back = ttk.Button(buttons, text="Go Back", command=self.go_back)
+        btn_back.pack(side=tk.LEFT, padx=5)
+
+        self.update_statistics()
+
+    def statistics_row(self, pair):
+        value, count = pair
+        total = self.aggregates.total
+        return (value, count, f"{count / total:.1%}" if total else "")
+
+    def update_statistics(self, force=True):
+        """Redraw the statistics screen if it is showing; without force, at most every STATISTICS_REFRESH_SECONDS."""
+        if self.statistics_tables is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.statistics_updated < STATISTICS_REFRESH_SECONDS:
+            return
+        self.statistics_updated = now
+        sections = self.aggregates.sections()
+        for section, table in self.statistics_tables.items():
+            table.set_rows(sections[section])
+        text = f"{self.aggregates.total} people"
+        if self.loading:
+            text += " loaded so far"
+        self.statistics_total.config(text=text)
+
+    def export_statistics(self):
+        """Save the statistics as a CSV or JSON report, the same as python aggregates.py writes."""
+        path = filedialog.asksaveasfilename(title="Export Statistics", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            with open(path, "w", newline="") as f:
+                export_report(f, self.aggregates, report_format(path))
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write {os.path.basename(path)}: {e}")
+            return
+        messagebox.showinfo("Success", f"Statistics exported to {os.path.basename(path)}.")
 
-        columns = ("Name", "SSN", "Phone Number", "Address", "DOB", "Height", "Race")
-        tree = ttk.Treeview(frame, columns=columns, show="headings")
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100, anchor=tk.W)
-
-        for person in self.data:
-            tree.insert("", tk.END, values=(
-                person.get("name", ""),
-                person.get("ssn", ""),
-                person.get("phone_number", ""),
-                person.get("address", ""),
-                person.get("dob", ""),
-                person.get("height", ""),
-                person.get("race", "")
-            ))
-
-        tree.pack(fill=tk.BOTH, expand=True, pady=10)
-
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    @profiling.profiled("show table")
+    def show_table(self, title_text, rows):
+        """
+        Show rows of people in a table. Only the rows on screen become Treeview items,
+        so opening the table takes the same time however many people there are.
+        """
+        self.clear_frame()
+        frame = ttk.Frame(self.root, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.current_frame = frame
+
+        title = ttk.Label(frame, text=title_text, font=("Helvetica", 16, "bold"))
+        title.pack(pady=10)
+        self.current_title = title
+
+        table = VirtualTable(frame, COLUMNS, rows, person_row, on_sort=self.sort_table)
+        table.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.current_table = table
+        self.table_rows = rows
+        self.sort_orders = {}
+        self.sort_column = None
+        self.sort_descending = False
 
         btn_back = ttk.Button(frame, text="Go Back", command=self.go_back)
         btn_back.pack(pady=5)
 
 
+    @profiling.profiled("sort table")
+    def sort_table(self, column):
+        """
+        Sort the table by a column; clicking the same heading again reverses the order.
+        All people are sorted by DOB or height straight from the ordered indexes. Other
+        orders are computed once per table and then just read forwards or backwards.
+        """
+        rows = self.table_rows
+        field = COLUMN_FIELDS[column]
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+
+        order = self.sort_orders.get(column)
+        if rows is self.data and field in self.ordered_indexes:
+            # The index stays sorted as people are added or removed, so it never goes stale
+            order = (self.ordered_indexes[field].entries, lambda entry: self.data.get(entry[1]))
+        elif order is None or len(order[0]) != len(rows):
+            key_function = sort_key_for(field)
+            keys = [key_function(rows[position]) for position in range(len(rows))]
+            order = (sorted(range(len(rows)), key=keys.__getitem__), rows.__getitem__)
+        self.sort_orders[column] = order
+
+        self.current_table.set_rows(OrderedRows(order[0], order[1], self.sort_descending))
+        self.current_table.show_sort(column, self.sort_descending)
+
+    def write_change(self, check, write):
+        """
+        Catch up with other windows, then call write(version) if check() still returns
+        no error message. The write expects the data at the version just caught up with
+        and is retried when another window gets in first. Returns an error message or None.
+        """
+        for attempt in range(WRITE_ATTEMPTS):
+            if self.loading or not self.catch_up():
+                return "People are still loading. Try again when loading has finished."
+            error = check()
+            if error:
+                return error
+            try:
+                write(storage.version)
+                return None
+            except ConflictError:
+                continue
+        return "The data is being changed by another window. Please try again."
+
+    def poll_changes(self):
+        """Pick up people other windows added or removed since the last check."""
+        if not self.loading and storage.changed():
+            with profiling.span("sync changes"):
+                self.catch_up()
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+
+    def catch_up(self):
+        """
+        Apply the changes other windows made since the last load or check.
+        Returns False when they could not be read one by one and everything is loading again.
+        """
+        changes = storage.sync()
+        if changes is None:
+            self.refresh_data()
+            return False
+        self.apply_changes(changes)
+        return True
+
+    def apply_changes(self, changes):
+        """Apply journal operations written by other windows to the loaded people."""
+        self.data.apply_changes(changes)
+        if changes and self.current_table is not None and self.table_rows is self.data:
+            # Positions sorted before the change no longer fit; sort the same way again
+            self.sort_orders = {}
+            if self.sort_column is not None:
+                self.sort_descending = not self.sort_descending
+                self.sort_table(self.sort_column)
+            else:
+                self.current_table.refresh()
+        if changes:
+            self.rerun_live_search()
+            self.update_statistics()
+
     def refresh_data(self):
-        self.data = load_data()
+        """Load every person again in the background, e.g. after another window saved the whole file."""
+        showing_all = self.current_table is not None and self.table_rows is self.data
+        self.build_store([])
+        self.loading = True
+        for button in self.data_buttons:
+            if button.winfo_exists():
+                button.configure(state=tk.DISABLED)
+        if showing_all:
+            self.show_all_people()
+        self.start_loading()
 
 def main():
     root = tk.Tk()
     app = IdentityManagerApp(root)
     root.mainloop()
+    storage.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,201 @@
+"""
+Running counts over the people in a RecordStore: by race, age band, height and state.
+
+    python aggregates.py report.csv
+    python aggregates.py report.json --data "Individuals' Data.json" --band 5
+
+Aggregates is attached to the store like an index, so adding or removing a person
+changes a few counters instead of counting everyone again. Dates of birth and heights
+are counted as they are written and only parsed when a report is made, once per
+distinct value; ages are grouped into bands then too, so they stay right as time passes.
+Files ending in .csv get one row per value counted; anything else gets a JSON report.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+from collections import Counter
+from datetime import date
+
+from bulk_import import file_format
+from record_store import dob_to_ordinal, height_to_inches, normalize_ssn
+from storage import DATA_FILE, StorageError, open_storage
+
+# Years per age band
+AGE_BAND = 10
+
+# The state is the two capital letters before the ZIP code at the end of an address,
+# e.g. "838 Catherine Ridges Apt. 163, Joneshaven, CO 37238"
+STATE_PATTERN = re.compile(r"\b([A-Z]{2}) \d{5}(?:-\d{4})?\s*$")
+# Only the end of the address is searched; the longest match is " ST 12345-6789"
+STATE_TAIL = 20
+
+UNKNOWN = "Unknown"
+
+SECTIONS = ("race", "age", "height", "state")
+
+
+def report_format(path):
+    """How export_report writes to a file: "csv" for .csv files, "json" for anything else."""
+    return "csv" if file_format(path) == "csv" else "json"
+
+
+def state_of(person):
+    address = str(person.get("address", ""))
+    match = STATE_PATTERN.search(address, max(0, len(address) - STATE_TAIL))
+    return match.group(1) if match else UNKNOWN
+
+
+def age_on(birth, today):
+    """Whole years from a birth date to today, both as date ordinals."""
+    born = date.fromordinal(birth)
+    on = date.fromordinal(today)
+    return on.year - born.year - ((on.month, on.day) < (born.month, born.day))
+
+
+def format_height(inches):
+    return f"{inches // 12}'{inches % 12}"
+
+
+class Aggregates:
+    """
+    Counts of people by race, date of birth, height and state. Attach it to a
+    RecordStore with store.attach(Aggregates()) to keep it up to date.
+    """
+
+    def __init__(self):
+        self.total = 0
+        # Raw field values -> number of people with them
+        self.races = Counter()
+        self.dobs = Counter()
+        self.heights = Counter()
+        self.states = Counter()
+
+    def insert(self, key, person):
+        self._count(person, 1)
+
+    def delete(self, key, person):
+        self._count(person, -1)
+
+    def _count(self, person, step):
+        self.total += step
+        for counter, value in ((self.races, person.get("race", "")), (self.dobs, person.get("dob", "")),
+                               (self.heights, person.get("height", "")), (self.states, state_of(person))):
+            count = counter[value] + step
+            if count:
+                counter[value] = count
+            else:
+                del counter[value]
+
+    def race_counts(self):
+        """(race, people) pairs, most common first."""
+        races = Counter()
+        for race, count in self.races.items():
+            races[str(race).strip() or UNKNOWN] += count
+        return races.most_common()
+
+    def state_counts(self):
+        """(state, people) pairs, most common first."""
+        return self.states.most_common()
+
+    def age_bands(self, width=AGE_BAND, today=None):
+        """(band, people) pairs from the youngest band up, e.g. ("30-39", 1200)."""
+        today = (today or date.today()).toordinal()
+        bands = Counter()
+        unknown = 0
+        for dob, count in self.dobs.items():
+            birth = dob_to_ordinal(dob)
+            if birth is None:
+                unknown += count
+                continue
+            bands[max(0, age_on(birth, today)) // width] += count
+        pairs = [(f"{band * width}-{band * width + width - 1}", bands[band]) for band in sorted(bands)]
+        if unknown:
+            pairs.append((UNKNOWN, unknown))
+        return pairs
+
+    def height_distribution(self):
+        """(height, people) pairs from the shortest up, e.g. ("5'11", 300)."""
+        inches = Counter()
+        unknown = 0
+        for height, count in self.heights.items():
+            value = height_to_inches(height)
+            if value is None:
+                unknown += count
+            else:
+                inches[value] += count
+        pairs = [(format_height(value), inches[value]) for value in sorted(inches)]
+        if unknown:
+            pairs.append((UNKNOWN, unknown))
+        return pairs
+
+    def sections(self, width=AGE_BAND, today=None):
+        """Every count, as a dict of section name -> list of (value, people)."""
+        return {
+            "race": self.race_counts(),
+            "age": self.age_bands(width, today),
+            "height": self.height_distribution(),
+            "state": self.state_counts()
+        }
+
+
+def aggregate_storage(storage):
+    """
+    Count everyone in storage without keeping them in memory. A repeated SSN is
+    counted once, as the app loads it only once.
+    """
+    aggregates = Aggregates()
+    seen = set()
+    for batch in storage.stream():
+        for person in batch:
+            key = normalize_ssn(str(person.get("ssn", "")))
+            if key not in seen:
+                seen.add(key)
+                aggregates.insert(key, person)
+    return aggregates
+
+
+def export_report(f, aggregates, fmt, width=AGE_BAND, today=None):
+    """Write the counts as CSV rows of section, value, people and share, or as one JSON document."""
+    sections = aggregates.sections(width, today)
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(["section", "value", "people", "share"])
+        for name in SECTIONS:
+            for value, count in sections[name]:
+                writer.writerow([name, value, count, f"{count / aggregates.total:.4f}"])
+        return
+    report = {"total": aggregates.total, "age_band_years": width,
+              "as_of": (today or date.today()).isoformat()}
+    for name in SECTIONS:
+        report[name] = [{"value": value, "people": count} for value, count in sections[name]]
+    json.dump(report, f, indent=2)
+    f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count people by race, age band, height and state.")
+    parser.add_argument("destination", help="CSV or JSON file to write the report to")
+    parser.add_argument("--data", default=DATA_FILE, help="data file to count")
+    parser.add_argument("--band", type=int, default=AGE_BAND, help=f"years per age band (default {AGE_BAND})")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.data):
+        parser.error(f"{args.data} does not exist")
+    if args.band < 1:
+        parser.error("--band must be at least 1")
+    try:
+        storage = open_storage(args.data)
+        aggregates = aggregate_storage(storage)
+        storage.close()
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+
+    with open(args.destination, "w", newline="") as f:
+        export_report(f, aggregates, report_format(args.destination), args.band)
+    print(f"Counted {aggregates.total} people; report written to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Local HTTP/JSON API over the same people as the Identity Manager, for other programs.
+
+    python api_server.py --port 8080
+
+    GET    /people?name=smith&dob=1970..1980&offset=0&limit=100   one page of matches
+    GET    /people?race=asian&stream=1                             every match, one JSON line each
+    GET    /people?name=jon+smyth&fuzzy=1                          misspelled names, closest first
+    GET    /people/123-45-6789                                     one person
+    POST   /people                                                 add a person (JSON body)
+    DELETE /people/123-45-6789                                     remove a person
+
+Searches and errors follow the Find, Add and Remove screens. All adds and removes go
+through a single writer task, one at a time, so concurrent requests cannot interleave
+their writes to the data file. The app and other tools can use the same data file at the
+same time: each request first picks up the changes they made, and a write is retried
+when one of them gets in between.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import traceback
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from indexed_store import build_indexed_store
+from search import in_ranges, matches, search, split_criteria
+from storage import DATA_FILE, ConflictError, StorageError, open_storage
+from validation import PERSON_FIELDS, ValidationError, auto_format_ssn, validate_person
+
+HOST = "127.0.0.1"
+PORT = 8080
+
+# Page size when a search does not give a limit, and the largest page allowed
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# People per chunk of a streamed response
+STREAM_BATCH = 1000
+
+# Times an add or remove is tried when another process keeps changing the data first
+WRITE_ATTEMPTS = 3
+
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """Ends a request with the given status and a JSON {"error": message} body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_request(reader):
+    """Read one HTTP/1.1 request, or return None when the client closed the connection."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line.") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(400, "Too many headers.")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = b""
+    if method in ("POST", "PUT"):
+        if "content-length" not in headers:
+            raise HttpError(411, "Content-Length is required.")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length.") from None
+        if not 0 <= length <= MAX_BODY:
+            raise HttpError(413, "Request body is too large.")
+        body = await reader.readexactly(length)
+
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return Request(method, unquote(url.path), query, headers, body)
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(response_head(status, {
+        "Content-Type": "application/json",
+        "Content-Length": len(body),
+        "Connection": "keep-alive" if keep_alive else "close"
+    }) + body)
+    await writer.drain()
+
+
+async def send_stream(writer, people, keep_alive=True):
+    """Send people as JSON lines with chunked encoding, waiting for the client between chunks."""
+    writer.write(response_head(200, {
+        "Content-Type": "application/x-ndjson",
+        "Transfer-Encoding": "chunked",
+        "Connection": "keep-alive" if keep_alive else "close"
+    }))
+    for start in range(0, len(people), STREAM_BATCH):
+        batch = people[start:start + STREAM_BATCH]
+        data = "".join(json.dumps(person) + "\n" for person in batch).encode("utf-8")
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def page_bounds(query):
+    try:
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise HttpError(400, "offset and limit must be whole numbers.") from None
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HttpError(400, f"offset must be 0 or more and limit between 1 and {MAX_PAGE_SIZE}.")
+    return offset, limit
+
+
+def load_store(people):
+    """A RecordStore of people with the indexes the API searches with, ready to be searched."""
+    store = build_indexed_store(people, cache=False, aggregates=False)
+    # Sort now rather than on the first range search: one sort of everyone holds up every thread
+    for index in store.ordered_indexes.values():
+        index.entries
+    # As in the app, keep the garbage collector's full collections from walking everyone
+    gc.freeze()
+    return store
+
+
+class ApiServer:
+    """
+    Serves the people in one data file. The RecordStore is only changed on the event
+    loop thread, and only while no search is running; searches and writes to storage run
+    on worker threads, and writes are queued through one writer task.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.use_store(load_store(storage.load()))
+        self.writes = None
+        self.writer_task = None
+        self.syncing = None
+        self.searches = None
+        self.running = 0        # searches on worker threads
+        self.changing = False   # a change is waiting for them to finish
+
+    def use_store(self, store):
+        self.data = store.data
+        self.search_index = store.search_index
+        self.name_index = store.name_index
+        self.ordered_indexes = store.ordered_indexes
+
+    async def start(self, host=HOST, port=PORT):
+        self.writes = asyncio.Queue()
+        # Held while catching up with other processes and while writing, so the two never interleave
+        self.syncing = asyncio.Lock()
+        self.searches = asyncio.Condition()
+        self.writer_task = asyncio.create_task(self.run_writer())
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def stop(self):
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_writer(self):
+        """Apply queued adds and removes one at a time, in the order they arrived."""
+        loop = asyncio.get_running_loop()
+        while True:
+            operation, argument, future = await self.writes.get()
+            try:
+                result = await operation(loop, argument)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+
+    async def write(self, operation, argument):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((operation, argument, future))
+        return await future
+
+    async def in_background(self, function, *args):
+        """
+        Run a search over the RecordStore on a worker thread, so a slow one does not hold up
+        other requests. It waits for a change that is already waiting for searches to finish.
+        """
+        async with self.searches:
+            await self.searches.wait_for(lambda: not self.changing)
+            self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+        finally:
+            async with self.searches:
+                self.running -= 1
+                self.searches.notify_all()
+
+    async def searches_finished(self):
+        """
+        Wait until no search is running, holding back new ones meanwhile. The caller changes
+        the RecordStore straight after, without awaiting anything, so no search can start first.
+        """
+        async with self.searches:
+            self.changing = True
+            try:
+                await self.searches.wait_for(lambda: self.running == 0)
+            finally:
+                self.changing = False
+                self.searches.notify_all()
+
+    def merge_pending(self):
+        """
+        Merge the people the ordered indexes buffered into their sorted entries, here on the
+        event loop after a change. Reading entries merges them otherwise, and searches on
+        worker threads must only read.
+        """
+        for index in self.ordered_indexes.values():
+            index.entries
+
+    async def catch_up(self):
+        """Pick up the people other processes added or removed since the last request."""
+        if self.storage.changed():
+            async with self.syncing:
+                await self.sync()
+
+    async def sync(self):
+        """Apply other processes' changes, or load everything again when they cannot be read one by one."""
+        loop = asyncio.get_running_loop()
+        try:
+            changes = await loop.run_in_executor(None, self.storage.sync)
+            if changes is None:
+                people = await loop.run_in_executor(None, self.storage.load)
+                store = await loop.run_in_executor(None, load_store, people)
+                await self.searches_finished()
+                self.use_store(store)
+                return
+        except (OSError, StorageError) as e:
+            raise HttpError(500, f"Could not read the data: {e}") from e
+        if changes:
+            await self.searches_finished()
+        self.data.apply_changes(changes)
+        self.merge_pending()
+
+    async def write_change(self, loop, check, write, apply):
+        """
+        Catch up with other processes, then run write(person, version) on a worker thread with
+        the person check() returns, unless it raises an HttpError, and apply(person) to the
+        RecordStore. The write expects the data at the version just caught up with and is
+        retried when another process gets in first.
+        """
+        for attempt in range(WRITE_ATTEMPTS):
+            async with self.syncing:
+                if self.storage.changed():
+                    await self.sync()
+                person = check()
+                try:
+                    await loop.run_in_executor(None, write, person, self.storage.version)
+                except ConflictError:
+                    continue
+                except (OSError, StorageError) as e:
+                    raise HttpError(500, f"Could not save the change: {e}") from e
+                await self.searches_finished()
+                apply(person)
+                self.merge_pending()
+                return person
+        raise HttpError(409, "The data is being changed by another process. Please try again.")
+
+    async def add_person(self, loop, person):
+        def check():
+            # Checked here rather than in the handler so two adds of one SSN cannot both pass
+            if person["ssn"] in self.data:
+                raise HttpError(409, "SSN already exists.")
+            return person
+
+        def apply(person):
+            # self.data is looked up now, as catching up can swap in a newly loaded store
+            self.data.add(person)
+
+        # Stored first, so searches never return someone who is not on disk yet
+        await self.write_change(loop, check, self.storage.add, apply)
+        return person
+
+    async def remove_person(self, loop, ssn):
+        def check():
+            person = self.data.get(ssn)
+            if person is None:
+                raise HttpError(404, "Person with the given SSN not found.")
+            return person
+
+        def write(person, version):
+            self.storage.remove(person["ssn"], version)
+
+        def apply(person):
+            self.data.remove(person["ssn"])
+
+        return await self.write_change(loop, check, write, apply)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                try:
+                    await self.dispatch(request, writer)
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": e.message}, request.keep_alive)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    # A bug rather than a bad request; part of a response may have been sent already
+                    traceback.print_exc()
+                    await send_json(writer, 500, {"error": "Internal server error."}, keep_alive=False)
+                    break
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, writer):
+        parts = [part for part in request.path.split("/") if part]
+        if not parts or parts[0] != "people" or len(parts) > 2:
+            raise HttpError(404, "Unknown path.")
+        if len(parts) == 1:
+            if request.method == "GET":
+                return await self.find(request, writer)
+            if request.method == "POST":
+                return await self.add(request, writer)
+        else:
+            if request.method == "GET":
+                return await self.get(parts[1], request, writer)
+            if request.method == "DELETE":
+                return await self.remove(parts[1], request, writer)
+        raise HttpError(405, f"{request.method} is not allowed on {request.path}.")
+
+    async def find(self, request, writer):
+        """Search like the Find screen; no criteria lists everyone."""
+        await self.catch_up()
+        criteria = {field: request.query.get(field, "").strip() for field in PERSON_FIELDS}
+        fuzzy = request.query.get("fuzzy") == "1" and bool(criteria["name"])
+        stream = request.query.get("stream") == "1"
+        if any(criteria.values()) or stream:
+            try:
+                results = await self.in_background(self.matching, criteria, fuzzy)
+            except ValueError as e:
+                raise HttpError(400, f"Invalid range: {e}") from None
+        else:
+            # A page of everyone is taken straight from the store
+            results = self.data
+
+        if stream:
+            return await send_stream(writer, results, request.keep_alive)
+        offset, limit = page_bounds(request.query)
+        page = [results[position] for position in range(offset, min(offset + limit, len(results)))]
+        next_offset = offset + limit if offset + limit < len(results) else None
+        await send_json(writer, 200, {"total": len(results), "offset": offset, "next_offset": next_offset,
+                                      "people": page}, request.keep_alive)
+
+    def matching(self, criteria, fuzzy):
+        """The people matching the criteria as a new list, everyone without criteria. Run through in_background."""
+        if fuzzy:
+            # Closest names first, the other fields matched as usual
+            others, ranges = split_criteria({key: value for key, value in criteria.items() if key != "name"})
+            ranked = self.name_index.search(self.data, criteria["name"])
+            return [person for _, person in ranked if matches(person, others) and in_ranges(person, ranges)]
+        if any(criteria.values()):
+            return search(self.data, criteria, self.search_index, self.ordered_indexes)
+        # A copy, as adds and removes can run while a stream waits on the client
+        return list(self.data)
+
+    async def get(self, ssn, request, writer):
+        await self.catch_up()
+        person = self.data.get(auto_format_ssn(ssn))
+        if person is None:
+            raise HttpError(404, "Person with the given SSN not found.")
+        await send_json(writer, 200, person, request.keep_alive)
+
+    async def add(self, request, writer):
+        """Add a person with the same checks and messages as the Add a Person form."""
+        try:
+            person = json.loads(request.body)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HttpError(400, "Body must be a JSON object.") from None
+        if not isinstance(person, dict):
+            raise HttpError(400, "Body must be a JSON object.")
+        try:
+            person = validate_person({field: str(person.get(field) or "").strip() for field in PERSON_FIELDS})
+        except ValidationError as e:
+            raise HttpError(400, str(e)) from None
+        person = await self.write(self.add_person, person)
+        await send_json(writer, 201, person, request.keep_alive)
+
+    async def remove(self, ssn, request, writer):
+        ssn = auto_format_ssn(ssn)
+        if len(ssn) != 11:
+            raise HttpError(400, "Invalid SSN format. Use XXX-XX-XXXX.")
+        person = await self.write(self.remove_person, ssn)
+        await send_json(writer, 200, person, request.keep_alive)
+
+
+async def serve(path, host=HOST, port=PORT, ready=None):
+    """Run the API until cancelled. ready, if given, is called with the listening server."""
+    storage = open_storage(path)
+    api = ApiServer(storage)
+    server = await api.start(host, port)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await api.stop()
+        storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Identity Manager data over a local HTTP/JSON API.")
+    parser.add_argument("--data", default=DATA_FILE, help="data file to serve")
+    parser.add_argument("--host", default=HOST, help=f"address to listen on (default {HOST}, this machine only)")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    args = parser.parse_args(argv)
+
+    def ready(server):
+        print(f"Serving {args.data} on http://{args.host}:{args.port}/people")
+
+    try:
+        asyncio.run(serve(args.data, args.host, args.port, ready))
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Load-test the HTTP API with many concurrent clients and report latency per request type.
+
+    python benchmarks/bench_api.py --size 100000 --clients 50 --requests 5000
+    python benchmarks/bench_api.py --url http://127.0.0.1:8080 --clients 20
+
+Without --url a server is started on a temporary data file of synthetic people, on its
+own thread and event loop so the clients do not slow it down. Against a running server
+the test adds and then removes people with SSNs from 900-00-0000 upwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from common import format_latencies, synthetic_people
+
+from api_server import ApiServer
+from storage import JournalStorage, write_json_snapshot
+
+# SSN numbers used for people the test adds, far from the synthetic ones
+FIRST_NEW_SSN = 900000000
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n\r\n"
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int(await self.reader.readline(), 16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            data = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def new_person(number):
+    person = next(synthetic_people(1, seed=number))
+    digits = f"{number:09d}"
+    person["ssn"] = f"{digits[:3]}-{digits[3:5]}-{digits[5:]}"
+    return person
+
+
+def build_plan(sample, count, seed):
+    """A shuffled mix of request kinds, each with the path to ask for."""
+    rng = random.Random(seed)
+    plan = []
+    added = 0
+    for i in range(count):
+        person = rng.choice(sample)
+        roll = rng.random()
+        if roll < 0.4:
+            plan.append(("find name", "GET", "/people?name=" + quote(person["name"].split()[-1][:4])))
+        elif roll < 0.6:
+            plan.append(("get ssn", "GET", "/people/" + person["ssn"]))
+        elif roll < 0.7:
+            year = int(person["dob"][:4])
+            plan.append(("find dob range", "GET", f"/people?dob={year}..{year}&limit=50"))
+        elif roll < 0.8:
+            plan.append(("find phone", "GET", "/people?phone_number=" + person["phone_number"]))
+        else:
+            plan.append(("add", "POST", new_person(FIRST_NEW_SSN + added)))
+            added += 1
+    return plan, added
+
+
+async def fetch_sample(host, port, count=1000):
+    """People to build requests from, read from the server so they exist there."""
+    client = Client(host, port)
+    try:
+        _, data = await client.request("GET", f"/people?limit={count}")
+    finally:
+        client.close()
+    return json.loads(data)["people"]
+
+
+async def run_clients(host, port, plan, added, clients):
+    latencies = {}
+    errors = 0
+
+    async def worker(queue):
+        nonlocal errors
+        client = Client(host, port)
+        try:
+            while queue:
+                kind, method, target = queue.pop()
+                start = time.perf_counter()
+                if method == "POST":
+                    status, _ = await client.request(method, "/people", target)
+                else:
+                    status, _ = await client.request(method, target)
+                latencies.setdefault(kind, []).append(time.perf_counter() - start)
+                if status >= 500 or (kind == "add" and status != 201):
+                    errors += 1
+        finally:
+            client.close()
+
+    queue = list(reversed(plan))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(queue) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    # Take the added people out again, as removes under the same load
+    queue = [("remove", "DELETE", "/people/" + new_person(FIRST_NEW_SSN + i)["ssn"]) for i in range(added)]
+    await asyncio.gather(*(worker(queue) for _ in range(clients)))
+    return latencies, errors, elapsed
+
+
+def start_local_server(directory, size, fsync):
+    path = os.path.join(directory, "people.json")
+    write_json_snapshot(path, synthetic_people(size))
+    storage = JournalStorage(path, fsync=fsync)
+    api = ApiServer(storage)
+    ready = threading.Event()
+    address = {}
+
+    async def run():
+        server = await api.start("127.0.0.1", 0)
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(run()), daemon=True).start()
+    ready.wait()
+    return "127.0.0.1", address["port"], storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--size", type=int, default=10000, help="people in the temporary data file")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="requests in the mix, not counting removes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-fsync", action="store_true", help="do not fsync the journal after each change")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port, storage = url.hostname, url.port or 80, None
+        else:
+            print(f"Starting a server with {args.size} people...")
+            host, port, storage = start_local_server(directory, args.size, not args.no_fsync)
+        sample = asyncio.run(fetch_sample(host, port))
+        plan, added = build_plan(sample, args.requests, args.seed)
+        latencies, errors, elapsed = asyncio.run(run_clients(host, port, plan, added, args.clients))
+        if storage is not None:
+            storage.close()
+
+    print(f"{len(plan)} requests from {args.clients} clients in {elapsed:.2f} s "
+          f"({len(plan) / elapsed:.0f} requests/s), {errors} errors")
+    for kind in sorted(latencies):
+        samples = latencies[kind]
+        print(f"{kind:15s} {len(samples):6d}  {format_latencies(samples)}")
+
+
+if __name__ == "__main__":
+    main()
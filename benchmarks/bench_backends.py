@@ -0,0 +1,96 @@
+"""
+Compare the JSON journal backend with the SQLite backend for load, add, remove and search.
+
+    python benchmarks/bench_backends.py --sizes 10000 1000000 10000000
+
+The JSON backend keeps every person in a RecordStore and searches by scanning it;
+the SQLite backend answers searches with SQL. 10M people need a lot of memory for the
+JSON backend, so start with the smaller sizes.
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from common import format_latencies, synthetic_people, timed
+
+from record_store import RecordStore
+from search import normalize_criteria, search
+from sqlite_storage import SQLiteStorage
+from storage import JournalStorage, write_json_snapshot
+
+
+def search_queries(sample, count, seed):
+    """Build a mix of name, SSN and phone searches from people known to be in the dataset."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        person = rng.choice(sample)
+        kind = i % 3
+        if kind == 0:
+            queries.append({"name": person["name"].split()[-1][:4]})
+        elif kind == 1:
+            queries.append({"ssn": person["ssn"]})
+        else:
+            queries.append({"phone_number": person["phone_number"]})
+    return queries
+
+
+def run_json(directory, size, new_people, queries, fsync):
+    path = os.path.join(directory, "people.json")
+    write_json_snapshot(path, synthetic_people(size))
+    storage = JournalStorage(path, fsync=fsync)
+    load_time, store = timed(lambda: RecordStore(storage.load()))
+
+    adds = []
+    for person in new_people:
+        seconds, _ = timed(lambda: (store.add(person), storage.add(person)))
+        adds.append(seconds)
+    removes = []
+    for person in new_people:
+        seconds, _ = timed(lambda: (store.remove(person["ssn"]), storage.remove(person["ssn"])))
+        removes.append(seconds)
+    searches = [timed(search, store, query)[0] for query in queries]
+    storage.close()
+    return load_time, adds, removes, searches
+
+
+def run_sqlite(directory, size, new_people, queries):
+    path = os.path.join(directory, "people.sqlite")
+    storage = SQLiteStorage(path)
+    load_time, _ = timed(storage.add_many, synthetic_people(size))
+
+    adds = [timed(storage.add, person)[0] for person in new_people]
+    removes = [timed(storage.remove, person["ssn"])[0] for person in new_people]
+    searches = [timed(storage.find, normalize_criteria(query))[0] for query in queries]
+    storage.close()
+    return load_time, adds, removes, searches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="dataset sizes to test")
+    parser.add_argument("--operations", type=int, default=200, help="adds and removes per size")
+    parser.add_argument("--searches", type=int, default=30, help="searches per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-fsync", action="store_true", help="do not fsync the JSON journal after each change")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        sample = list(synthetic_people(1000, args.seed, start=size // 2))
+        new_people = list(synthetic_people(args.operations, args.seed, start=size))
+        queries = search_queries(sample, args.searches, args.seed)
+        print(f"== {size} people ==")
+        with tempfile.TemporaryDirectory() as directory:
+            for name, run in (("json", lambda: run_json(directory, size, new_people, queries, not args.no_fsync)),
+                              ("sqlite", lambda: run_sqlite(directory, size, new_people, queries))):
+                load_time, adds, removes, searches = run()
+                label = "load" if name == "json" else "bulk insert"
+                print(f"{name:7s} {label:11s} {load_time:9.2f} s")
+                print(f"{name:7s} add         {format_latencies(adds)}")
+                print(f"{name:7s} remove      {format_latencies(removes)}")
+                print(f"{name:7s} search      {format_latencies(searches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measure bulk import throughput: validation alone (per person and by column), and the full import into a journal.
+
+    python benchmarks/bench_import.py --count 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+
+from common import synthetic_people, timed
+
+from bulk_import import import_file, read_chunks
+from storage import JournalStorage
+from validation import PERSON_FIELDS, ValidationError, validate_columns, validate_person
+
+
+def write_csv(path, count, invalid_fraction, seed):
+    """Write count synthetic people to a CSV file, damaging a fraction of the rows."""
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PERSON_FIELDS)
+        writer.writeheader()
+        for person in synthetic_people(count, seed):
+            if rng.random() < invalid_fraction:
+                person[rng.choice(["ssn", "phone_number", "dob", "name"])] = "bad!"
+            writer.writerow(person)
+
+
+def validate_only(path):
+    valid = 0
+    with open(path, "r", newline="") as f:
+        for chunk in read_chunks(f, "csv"):
+            for values in zip(*(chunk.columns[field] for field in PERSON_FIELDS)):
+                try:
+                    validate_person(dict(zip(PERSON_FIELDS, values)))
+                    valid += 1
+                except ValidationError:
+                    pass
+    return valid
+
+
+def validate_by_column(path):
+    valid = 0
+    with open(path, "r", newline="") as f:
+        for chunk in read_chunks(f, "csv"):
+            valid += sum(validate_columns(chunk.columns).valid)
+    return valid
+
+
+def full_import(path, data_path):
+    storage = JournalStorage(data_path, compact_every=10 ** 12)
+    with open(path, "r", newline="") as f:
+        report = import_file(f, "csv", set(), storage)
+    storage.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000, help="rows in the import file")
+    parser.add_argument("--invalid", type=float, default=0.05, help="fraction of rows made invalid")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "people.csv")
+        write_csv(source, args.count, args.invalid, args.seed)
+
+        seconds, valid = timed(validate_only, source)
+        print(f"read + validate per person: {args.count / seconds:10.0f} rows/s ({valid} valid)")
+
+        seconds, valid = timed(validate_by_column, source)
+        print(f"read + validate by column:  {args.count / seconds:10.0f} rows/s ({valid} valid)")
+
+        seconds, report = timed(full_import, source, os.path.join(directory, "people.json"))
+        print(f"full import:                {args.count / seconds:10.0f} rows/s "
+              f"({report.added} added, {len(report.errors)} rejected)")
+
+
+if __name__ == "__main__":
+    main()
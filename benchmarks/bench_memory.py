@@ -0,0 +1,47 @@
+"""
+Compare the memory used by the people list as plain dicts and as ColumnarRecords.
+
+    python benchmarks/bench_memory.py --count 1000000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from common import synthetic_people
+
+from columnar_store import ColumnarRecords
+
+
+def generate_lines(count):
+    """Yield JSON lines for count people; each is parsed separately so no strings are shared."""
+    for person in synthetic_people(count):
+        yield json.dumps(person)
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    records = build(json.loads(line) for line in generate_lines(count))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    gc.collect()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000, help="number of people to load")
+    args = parser.parse_args()
+
+    dict_bytes = measure(list, args.count)
+    columnar_bytes = measure(ColumnarRecords, args.count)
+    print(f"{args.count} people")
+    print(f"list of dicts:    {dict_bytes / 2**20:9.1f} MiB ({dict_bytes / args.count:6.0f} bytes/person)")
+    print(f"ColumnarRecords:  {columnar_bytes / 2**20:9.1f} MiB ({columnar_bytes / args.count:6.0f} bytes/person)")
+    print(f"saving:           {1 - columnar_bytes / dict_bytes:9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Headless benchmark suite for the data-layer hot paths of the Identity Manager.
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --sizes 1000 100000 --compare results.json
+
+Datasets are made by Data Creator.py with a fixed seed and cached in benchmarks/data,
+so every run measures the same people. Each case runs in a fresh process and reports
+throughput, latency percentiles where it times single operations, and the peak memory
+the case added on top of the process it started in. Results are saved as JSON;
+--compare prints the change against an earlier results file and exits with status 1
+when something got slower by more than --tolerance or a case failed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import time
+
+from common import ROOT_DIR, percentile, synthetic_people
+
+from indexed_store import build_indexed_store
+from search import search
+from storage import LOCK_SUFFIX, SNAPSHOT_LOCK_SUFFIX, JournalStorage, write_json_snapshot
+from validation import ValidationError, validate_person
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SIZES = [1000, 100000, 1000000]
+SEED = 42
+DATA_DIR = os.path.join(ROOT_DIR, "benchmarks", "data")
+DATA_CREATOR = os.path.join(ROOT_DIR, "Data Creator.py")
+
+# Single operations timed per case and size
+SEARCHES = 100
+ADDS = 200
+WINDOWS = 500
+TABLE_ROWS = 40
+
+# How often run_isolated checks that a case's process is still running while it waits for the result
+POLL_SECONDS = 1
+
+
+def dataset_path(size, seed, synthetic=False):
+    """Return the JSON data file for size people, creating it the first time."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    kind = "synthetic" if synthetic else "creator"
+    path = os.path.join(DATA_DIR, f"{kind}-{size}-seed{seed}.json")
+    if not os.path.exists(path):
+        print(f"  creating {os.path.basename(path)}...", flush=True)
+        if synthetic:
+            write_json_snapshot(path, synthetic_people(size, seed))
+        else:
+            subprocess.run([sys.executable, DATA_CREATOR, "--count", str(size), "--seed", str(seed),
+                            "--format", "json", "--output", path + ".tmp", "--workers", str(os.cpu_count() or 1)],
+                           check=True)
+            os.replace(path + ".tmp", path)
+    return path
+
+
+def peak_memory():
+    """Peak resident memory of this process in bytes, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def search_queries(people, count, seed):
+    """A mix of the searches people run from the Find screen."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        person = rng.choice(people)
+        kind = i % 5
+        if kind == 0:
+            queries.append({"name": person["name"].split()[-1][:4]})
+        elif kind == 1:
+            queries.append({"ssn": person["ssn"]})
+        elif kind == 2:
+            queries.append({"phone_number": person["phone_number"]})
+        elif kind == 3:
+            queries.append({"dob": f"{person['dob'][:4]}..{person['dob'][:4]}"})
+        else:
+            queries.append({"address": person["address"].split(",")[-1].strip()[:2], "height": ">6'0"})
+    return queries
+
+
+def new_people(count, seed):
+    for i, person in enumerate(synthetic_people(count, seed)):
+        person["ssn"] = f"999-{i // 10000 % 100:02d}-{i % 10000:04d}"
+        yield person
+
+
+def remove_copy(path):
+    """Delete a scratch data file with its journal and lock files."""
+    for leftover in (path, path + ".journal", path + LOCK_SUFFIX, path + SNAPSHOT_LOCK_SUFFIX):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+# Each case takes the data file path and returns (operations, seconds, per-operation latencies or None)
+
+def case_load(path, seed):
+    storage = JournalStorage(path)
+    start = time.perf_counter()
+    people = storage.load()
+    return len(people), time.perf_counter() - start, None
+
+
+def case_load_indexed(path, seed):
+    """What the app does at startup: stream the file into a RecordStore with its indexes."""
+    storage = JournalStorage(path)
+    start = time.perf_counter()
+    store = build_indexed_store(person for batch in storage.stream() for person in batch).data
+    return len(store), time.perf_counter() - start, None
+
+
+def case_save(path, seed):
+    people = JournalStorage(path).load()
+    copy = path + ".bench"
+    storage = JournalStorage(copy)
+    start = time.perf_counter()
+    storage.save(people)
+    seconds = time.perf_counter() - start
+    storage.close()
+    remove_copy(copy)
+    return len(people), seconds, None
+
+
+def case_search(path, seed):
+    indexed = build_indexed_store(JournalStorage(path).load())
+    store = indexed.data
+    latencies = []
+    for query in search_queries(list(store[position] for position in range(min(len(store), 1000))), SEARCHES, seed):
+        start = time.perf_counter()
+        search(store, query, indexed.search_index, indexed.ordered_indexes)
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), sum(latencies), latencies
+
+
+def case_validate(path, seed):
+    people = JournalStorage(path).load()
+    latencies = []
+    for person in people:
+        start = time.perf_counter()
+        try:
+            validate_person(person)
+        except ValidationError:
+            pass
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), sum(latencies), latencies
+
+
+def case_submit(path, seed):
+    """submit_person without the dialogs: validate, check the SSN, add to the store and the journal."""
+    store = build_indexed_store(JournalStorage(path).load()).data
+    copy = path + ".bench"
+    storage = JournalStorage(copy)
+    latencies = []
+    for person in new_people(ADDS, seed):
+        start = time.perf_counter()
+        person = validate_person(person)
+        if person["ssn"] not in store:
+            store.add(person)
+            storage.add(person)
+        latencies.append(time.perf_counter() - start)
+    storage.close()
+    remove_copy(copy)
+    return len(latencies), sum(latencies), latencies
+
+
+def case_table(path, seed):
+    """
+    The data side of filling the Treeview: the values of one screenful of rows at a
+    random scroll position, as VirtualTable asks for them.
+    """
+    store = build_indexed_store(JournalStorage(path).load()).data
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(WINDOWS):
+        offset = rng.randrange(max(1, len(store) - TABLE_ROWS))
+        start = time.perf_counter()
+        for position in range(offset, min(offset + TABLE_ROWS, len(store))):
+            person = store[position]
+            tuple(person.get(field, "") for field in ("name", "ssn", "phone_number", "address", "dob", "height", "race"))
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), sum(latencies), latencies
+
+
+def case_sort(path, seed):
+    """Sorting the All People table by name: computing the keys once and sorting positions."""
+    store = build_indexed_store(JournalStorage(path).load()).data
+    start = time.perf_counter()
+    keys = [str(store[position].get("name", "")).lower() for position in range(len(store))]
+    sorted(range(len(store)), key=keys.__getitem__)
+    return len(store), time.perf_counter() - start, None
+
+
+CASES = {
+    "load": case_load,
+    "load_indexed": case_load_indexed,
+    "save": case_save,
+    "search": case_search,
+    "validate": case_validate,
+    "submit": case_submit,
+    "table_window": case_table,
+    "sort_name": case_sort,
+}
+
+
+def run_case(name, path, seed, results):
+    before = peak_memory()
+    operations, seconds, latencies = CASES[name](path, seed)
+    after = peak_memory()
+    result = {
+        "operations": operations,
+        "seconds": seconds,
+        "throughput": operations / seconds if seconds else None,
+        "peak_memory_mb": None if before is None else max(0, after - before) / 2 ** 20
+    }
+    if latencies:
+        result.update({"p50_ms": percentile(latencies, 0.5) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+                       "max_ms": max(latencies) * 1000})
+    results.put(result)
+
+
+def run_isolated(name, path, seed):
+    """
+    Run one case in a fresh process, so each one's peak memory is its own. A case whose
+    process dies or exits with an error gives {"error": ...} instead of its measurements.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_case, args=(name, path, seed, results))
+    process.start()
+    result = None
+    while result is None:
+        # Checked before waiting, so a result put just before the process exited is still picked up
+        alive = process.is_alive()
+        try:
+            result = results.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if not alive:
+                break
+    process.join()
+    if process.exitcode != 0:
+        return {"error": f"the case's process exited with status {process.exitcode}"}
+    if result is None:
+        return {"error": "the case's process exited without a result"}
+    return result
+
+
+def compare(current, previous, tolerance):
+    """Print how each result moved against an earlier run; returns the number of regressions and failed cases."""
+    earlier = {(result["case"], result["size"]): result for result in previous["results"]}
+    regressions = 0
+    print(f"\nCompared with {previous['meta'].get('started', 'the earlier run')}:")
+    for result in current["results"]:
+        if "error" in result:
+            regressions += 1
+            print(f"  {result['case']:13s} {result['size']:>9d}  FAILED")
+            continue
+        old = earlier.get((result["case"], result["size"]))
+        if old is None:
+            continue
+        changes = []
+        slower = False
+        if old.get("throughput") and result.get("throughput"):
+            ratio = result["throughput"] / old["throughput"]
+            changes.append(f"throughput {ratio - 1:+.1%}")
+            slower = slower or ratio < 1 - tolerance
+        if old.get("p99_ms") and result.get("p99_ms"):
+            ratio = result["p99_ms"] / old["p99_ms"]
+            changes.append(f"p99 {ratio - 1:+.1%}")
+            slower = slower or ratio > 1 + tolerance
+        regressions += slower
+        flag = "  REGRESSION" if slower else ""
+        print(f"  {result['case']:13s} {result['size']:>9d}  {', '.join(changes)}{flag}")
+    return regressions
+
+
+def format_result(result):
+    if "error" in result:
+        return f"FAILED: {result['error']}"
+    text = f"{result['throughput']:12.0f} ops/s" if result["throughput"] else f"{'':16s}"
+    if "p50_ms" in result:
+        text += f"  p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms"
+    if result["peak_memory_mb"] is not None:
+        text += f"  peak +{result['peak_memory_mb']:.0f} MiB"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="dataset sizes (default 1k, 100k, 1M)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"Data Creator seed (default {SEED})")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="cases to run")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown counted as a regression by --compare (default 0.1, i.e. 10%%)")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="use the benchmark's own generator instead of Data Creator.py (no Faker needed)")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "dataset": "synthetic" if args.synthetic else "Data Creator.py"
+        },
+        "results": []
+    }
+    for size in args.sizes:
+        print(f"== {size} people ==", flush=True)
+        path = dataset_path(size, args.seed, args.synthetic)
+        for name in args.cases:
+            result = run_isolated(name, path, args.seed)
+            report["results"].append({"case": name, "size": size, **result})
+            print(f"{name:13s} {format_result(result)}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare(report, previous, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
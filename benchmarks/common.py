@@ -0,0 +1,63 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+               "Christopher", "Lisa", "Daniel", "Nancy", "Matthew", "Betty", "Anthony", "Sandra", "Mark", "Ashley"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+              "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Park Blvd", "Lake Way", "Hill Ct"]
+CITIES = ["Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Clinton", "Fairview", "Salem"]
+STATES = ["AL", "AK", "AZ", "CA", "CO", "FL", "GA", "IL", "NY", "OH", "PA", "TX", "WA", "WI"]
+RACES = ['White', 'Black or African American', 'Asian', 'Native American', 'Pacific Islander', 'Other']
+
+
+def synthetic_people(count, seed=0, start=0):
+    """
+    Yield count people shaped like the ones Data Creator.py makes, without needing Faker.
+    SSNs are unique across indexes start..start+count.
+    """
+    rng = random.Random(seed * 1000003 + start)
+    for i in range(start, start + count):
+        yield {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "ssn": f"{i // 1000000 % 1000:03d}-{i // 10000 % 100:02d}-{i % 10000:04d}",
+            "phone_number": f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            "address": (f"{rng.randint(1, 99999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}, "
+                        f"{rng.choice(STATES)} {rng.randint(10000, 99999)}"),
+            "dob": f"{rng.randint(1935, 2007)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "height": f"{rng.randint(4, 6)}'{rng.randint(0, 11)}",
+            "race": rng.choice(RACES)
+        }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed(function, *args):
+    """Call function and return (seconds taken, result)."""
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def format_latencies(samples):
+    """Summarize per-operation timings in microseconds."""
+    if not samples:
+        return "n/a"
+    mean = sum(samples) / len(samples)
+    return (f"mean {mean * 1e6:9.1f} us  p50 {percentile(samples, 0.5) * 1e6:9.1f} us  "
+            f"p99 {percentile(samples, 0.99) * 1e6:9.1f} us")
@@ -0,0 +1,233 @@
+"""
+Binary snapshot format for the people list, readable through mmap without parsing the whole file.
+
+Layout (all integers little-endian):
+    header     magic "IDMSNAP1", count (u64), offsets position (u64), SSN index position (u64)
+    records    one per person: flag byte 0 then the seven fields as u32 length + UTF-8 bytes,
+               or flag byte 1 then u32 length + JSON for records with other fields
+    offsets    count x u64, the file position of each record
+    SSN index  count x (u64 hash of the normalized SSN, u64 record number), sorted by hash
+
+Convert between formats with:
+    python binary_snapshot.py to-binary "Individuals' Data.json" "Individuals' Data.idb"
+    python binary_snapshot.py to-json "Individuals' Data.idb" "Individuals' Data.json"
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from record_store import normalize_ssn
+from storage import SnapshotFormat, StorageError, open_storage, write_json_snapshot
+from validation import PERSON_FIELDS
+
+MAGIC = b"IDMSNAP1"
+HEADER = struct.Struct("<8sQQQ")
+LENGTH = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+INDEX_ENTRY = struct.Struct("<QQ")
+FIELD_SET = frozenset(PERSON_FIELDS)
+PLAIN, WHOLE_JSON = 0, 1
+
+
+def ssn_hash(ssn):
+    """64-bit hash of the normalized SSN, used to sort and search the SSN index."""
+    digest = hashlib.blake2b(normalize_ssn(ssn).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def encode_person(person):
+    if person.keys() == FIELD_SET and all(isinstance(person[field], str) for field in PERSON_FIELDS):
+        parts = [bytes((PLAIN,))]
+        for field in PERSON_FIELDS:
+            value = person[field].encode("utf-8")
+            parts.append(LENGTH.pack(len(value)))
+            parts.append(value)
+        return b"".join(parts)
+    value = json.dumps(person).encode("utf-8")
+    return bytes((WHOLE_JSON,)) + LENGTH.pack(len(value)) + value
+
+
+def write_binary_snapshot(path, records):
+    """
+    Write records to a binary snapshot, atomically replacing path.
+    Records are streamed to disk; only the offsets and SSN hashes are kept in memory.
+    """
+    offsets = array("Q")
+    hashes = array("Q")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0))
+        position = HEADER.size
+        for person in records:
+            data = encode_person(person)
+            offsets.append(position)
+            hashes.append(ssn_hash(str(person.get("ssn", ""))))
+            f.write(data)
+            position += len(data)
+
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        offsets_position = position
+        f.write(offsets.tobytes())
+        index_position = offsets_position + OFFSET.size * len(offsets)
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        for start in range(0, len(order), 65536):
+            f.write(b"".join(INDEX_ENTRY.pack(hashes[ordinal], ordinal) for ordinal in order[start:start + 65536]))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(offsets), offsets_position, index_position))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BinarySnapshot:
+    """
+    Read-only view of a binary snapshot. Records are decoded only when asked for,
+    by position or by SSN, straight from the memory-mapped file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise StorageError(f"{os.path.basename(path)} is too short to be a snapshot.")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._offsets, self._index = HEADER.unpack_from(self._map, 0)
+        expected_end = self._index + INDEX_ENTRY.size * self.count
+        if magic != MAGIC or self._offsets + OFFSET.size * self.count != self._index or expected_end != size:
+            self.close()
+            raise StorageError(f"{os.path.basename(path)} is damaged or not a binary snapshot.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for ordinal in range(self.count):
+            yield self[ordinal]
+
+    def __getitem__(self, ordinal):
+        if ordinal < 0:
+            ordinal += self.count
+        if not 0 <= ordinal < self.count:
+            raise IndexError("record index out of range")
+        position, = OFFSET.unpack_from(self._map, self._offsets + OFFSET.size * ordinal)
+        return self._decode(position)
+
+    def find(self, ssn):
+        """Return the person with the given SSN using a binary search of the SSN index, or None."""
+        target = ssn_hash(ssn)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            value, _ = INDEX_ENTRY.unpack_from(self._map, self._index + INDEX_ENTRY.size * middle)
+            if value < target:
+                low = middle + 1
+            else:
+                high = middle
+        key = normalize_ssn(ssn)
+        # Hash collisions are possible, so check every entry with the same hash
+        while low < self.count:
+            value, ordinal = INDEX_ENTRY.unpack_from(self._map, self._index + INDEX_ENTRY.size * low)
+            if value != target:
+                break
+            person = self[ordinal]
+            if normalize_ssn(str(person.get("ssn", ""))) == key:
+                return person
+            low += 1
+        return None
+
+    def _decode(self, position):
+        data = self._map
+        flag = data[position]
+        position += 1
+        if flag == WHOLE_JSON:
+            length, = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            return json.loads(data[position:position + length])
+        person = {}
+        for field in PERSON_FIELDS:
+            length, = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            person[field] = data[position:position + length].decode("utf-8")
+            position += length
+        return person
+
+
+def read_binary_snapshot(path):
+    """Read every person from a binary snapshot; a missing file is an empty dataset."""
+    return list(iter_binary_snapshot(path))
+
+
+def iter_binary_snapshot(path, on_progress=None):
+    if not os.path.exists(path):
+        return
+    with BinarySnapshot(path) as snapshot:
+        count = len(snapshot)
+        for ordinal, person in enumerate(snapshot):
+            yield person
+            if on_progress is not None and ordinal % 10000 == 0:
+                on_progress(ordinal / count)
+    if on_progress is not None:
+        on_progress(1.0)
+
+
+BINARY_SNAPSHOT = SnapshotFormat(read_binary_snapshot, iter_binary_snapshot, write_binary_snapshot)
+
+
+def iter_data_file(path):
+    """Every person in a data file as the app would load it: the snapshot with its journal applied."""
+    storage = open_storage(path)
+    try:
+        for batch in storage.stream():
+            yield from batch
+    finally:
+        storage.close()
+
+
+def json_to_binary(source, destination):
+    write_binary_snapshot(destination, iter_data_file(source))
+
+
+def binary_to_json(source, destination):
+    write_json_snapshot(destination, iter_data_file(source))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert snapshots between JSON and the binary format.")
+    parser.add_argument("direction", choices=["to-binary", "to-json"])
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    try:
+        if args.direction == "to-binary":
+            json_to_binary(args.source, args.destination)
+        else:
+            binary_to_json(args.source, args.destination)
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Headless import and export of people, using the same validation as the Add a Person form.
+
+    python bulk_import.py import people.csv --errors rejected.csv
+    python bulk_import.py export everyone.jsonl
+
+Files ending in .csv are read and written as CSV with a header row; anything else is
+JSON lines, one person per line. The data file defaults to the one the app uses.
+"""
+import argparse
+import csv
+import json
+import sys
+from collections import namedtuple
+
+from record_store import normalize_ssn
+from storage import BATCH_SIZE, DATA_FILE, StorageError, open_storage
+from validation import PERSON_FIELDS, validate_columns
+
+# Up to batch_size rows of an import file: the row numbers of the rows that could be parsed,
+# their stripped values as a dict of field -> list, and the row numbers of rows that could not
+Chunk = namedtuple("Chunk", ["row_numbers", "columns", "unparsed"])
+
+
+class ImportReport:
+    """What happened to the rows of an import: how many were added, and why others were not."""
+
+    def __init__(self):
+        self.rows = 0
+        self.added = 0
+        self.errors = []  # (row number, SSN as given, message)
+
+    def reject(self, row_number, ssn, message):
+        self.errors.append((row_number, ssn, message))
+
+
+def file_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_chunks(f, fmt, batch_size=BATCH_SIZE):
+    """
+    Yield the rows of an import file as Chunks. CSV rows go from csv.reader straight into
+    columns, without a dict per row; a missing column or value reads as "".
+    """
+    if fmt == "csv":
+        yield from read_csv_chunks(f, batch_size)
+        return
+    row_numbers, unparsed = [], []
+    columns = {field: [] for field in PERSON_FIELDS}
+    for row_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        if not isinstance(row, dict):
+            unparsed.append(row_number)
+            continue
+        row_numbers.append(row_number)
+        for field in PERSON_FIELDS:
+            columns[field].append(str(row.get(field) or "").strip())
+        if len(row_numbers) + len(unparsed) >= batch_size:
+            yield Chunk(row_numbers, columns, unparsed)
+            row_numbers, unparsed = [], []
+            columns = {field: [] for field in PERSON_FIELDS}
+    if row_numbers or unparsed:
+        yield Chunk(row_numbers, columns, unparsed)
+
+
+def read_csv_chunks(f, batch_size):
+    reader = csv.reader(f)
+    header = next(reader, [])
+    width = len(header)
+    positions = {field: header.index(field) for field in PERSON_FIELDS if field in header}
+    # Rows are numbered as csv.DictReader counts them: blank lines are skipped, the header is row 1
+    row_number = 2
+    rows = []
+    for row in reader:
+        if row:
+            rows.append(row)
+        if len(rows) >= batch_size:
+            yield csv_chunk(rows, row_number, width, positions)
+            row_number += len(rows)
+            rows = []
+    if rows:
+        yield csv_chunk(rows, row_number, width, positions)
+
+
+def csv_chunk(rows, first_row_number, width, positions):
+    # Short rows are padded so that zip() gives every column in full
+    rows = [row if len(row) >= width else row + [""] * (width - len(row)) for row in rows]
+    values = list(zip(*rows))
+    columns = {}
+    for field in PERSON_FIELDS:
+        position = positions.get(field)
+        columns[field] = [""] * len(rows) if position is None else list(map(str.strip, values[position]))
+    return Chunk(range(first_row_number, first_row_number + len(rows)), columns, [])
+
+
+def existing_keys(storage):
+    """The normalized SSNs of everyone in storage, for import_file's duplicate check."""
+    return {normalize_ssn(str(person.get("ssn", ""))) for batch in storage.stream() for person in batch}
+
+
+def import_file(f, fmt, keys, storage, batch_size=BATCH_SIZE):
+    """
+    Validate the rows of an import file a batch at a time, skip SSNs in keys (the normalized
+    SSNs already stored, which is updated) or earlier in the file, and write the rest to storage.
+    Problems are collected in the report instead of stopping the import.
+    """
+    report = ImportReport()
+    for chunk in read_chunks(f, fmt, batch_size):
+        import_chunk(chunk, keys, storage, report)
+    report.errors.sort()
+    return report
+
+
+def import_chunk(chunk, keys, storage, report):
+    report.rows += len(chunk.row_numbers) + len(chunk.unparsed)
+    for row_number in chunk.unparsed:
+        report.reject(row_number, "", "Row is not a valid record.")
+    checked = validate_columns(chunk.columns)
+    given_ssns = chunk.columns["ssn"]
+    accepted = []
+    for position, (valid, key) in enumerate(zip(checked.valid, map(normalize_ssn, checked.columns["ssn"]))):
+        if not valid:
+            report.reject(chunk.row_numbers[position], given_ssns[position], checked.first_error(position))
+        elif key in keys:
+            report.reject(chunk.row_numbers[position], given_ssns[position], "SSN already exists.")
+        else:
+            keys.add(key)
+            accepted.append(position)
+    # Dicts only for the people being written, made from the validated columns
+    people = list(zip(*(checked.columns[field] for field in PERSON_FIELDS)))
+    report.added += storage.add_many([dict(zip(PERSON_FIELDS, people[position])) for position in accepted])
+
+
+def write_errors(path, report):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["row", "ssn", "error"])
+        writer.writerows(report.errors)
+
+
+def export_people(storage, f, fmt):
+    """Write every person in storage to f; returns how many were written."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=PERSON_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+    for batch in storage.stream():
+        if fmt == "csv":
+            writer.writerows(batch)
+        else:
+            f.write("".join(json.dumps(person) + "\n" for person in batch))
+        count += len(batch)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export Identity Manager data without the GUI.")
+    parser.add_argument("--data", default=DATA_FILE, help="data file to import into or export from")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="validate and add people from a CSV or JSON-lines file")
+    import_parser.add_argument("source")
+    import_parser.add_argument("--errors", help="write rejected rows and the reason to this CSV file")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="people written per batch")
+    export_parser = subparsers.add_parser("export", help="write every person to a CSV or JSON-lines file")
+    export_parser.add_argument("destination")
+    args = parser.parse_args(argv)
+
+    try:
+        storage = open_storage(args.data)
+        try:
+            if args.command == "export":
+                with open(args.destination, "w", newline="") as f:
+                    count = export_people(storage, f, file_format(args.destination))
+                print(f"Exported {count} people to {args.destination}")
+                return
+
+            keys = existing_keys(storage)
+            with open(args.source, "r", newline="") as f:
+                report = import_file(f, file_format(args.source), keys, storage, args.batch_size)
+        finally:
+            storage.close()
+    except (OSError, StorageError) as e:
+        parser.exit(1, f"error: {e}\n")
+
+    print(f"Read {report.rows} rows: {report.added} added, {len(report.errors)} rejected")
+    if args.errors:
+        write_errors(args.errors, report)
+    else:
+        for row_number, ssn, message in report.errors[:20]:
+            print(f"  row {row_number} ({ssn or 'no SSN'}): {message}", file=sys.stderr)
+        if len(report.errors) > 20:
+            print(f"  ... and {len(report.errors) - 20} more; use --errors to save them all", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
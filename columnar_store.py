@@ -0,0 +1,153 @@
+from array import array
+from datetime import date
+
+from record_store import dob_to_ordinal, height_to_inches
+from validation import PERSON_FIELDS
+
+FIELD_SET = frozenset(PERSON_FIELDS)
+
+# Value stored in a packed column when the real value is kept in the overflow dict
+MISSING = -1
+MISSING_HEIGHT = 0xFFFF
+
+
+def pack_digits(value, layout):
+    """
+    Pack a dashed number such as an SSN into an integer.
+    Returns None unless formatting the integer again gives back exactly the same string.
+    """
+    digits = value.replace("-", "")
+    if not digits.isdigit() or format_digits(int(digits), layout) != value:
+        return None
+    return int(digits)
+
+
+def format_digits(number, layout):
+    """Format an integer with dashes, e.g. layout (3, 2, 4) gives XXX-XX-XXXX."""
+    digits = str(number).zfill(sum(layout))
+    parts = []
+    start = 0
+    for size in layout:
+        parts.append(digits[start:start + size])
+        start += size
+    return "-".join(parts)
+
+
+SSN_LAYOUT = (3, 2, 4)
+PHONE_LAYOUT = (3, 3, 4)
+
+
+class ColumnarRecords:
+    """
+    Compact list of people stored column by column instead of as one dict each.
+
+    SSNs and phone numbers are packed into 64-bit integers, dates of birth into
+    day numbers, heights into inches, and races into codes from a small dictionary.
+    Values that do not fit the packed format are kept as strings in an overflow
+    dict, so every record reads back exactly as it was stored. Indexing returns
+    a new dict for the record, which keeps the read API of the plain list.
+    """
+
+    def __init__(self, records=()):
+        self.names = []
+        self.addresses = []
+        self.ssns = array("q")
+        self.phones = array("q")
+        self.dobs = array("i")
+        self.heights = array("H")
+        self.races = array("H")
+        self.race_values = []
+        self.race_codes = {}
+        self.overflow = {}  # row -> dict of fields stored as plain strings
+        for person in records:
+            self.append(person)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for row in range(len(self.names)):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.names)
+        if not 0 <= row < len(self.names):
+            raise IndexError("record index out of range")
+        extra = self.overflow.get(row)
+        if extra is not None and "__all__" in extra:
+            return dict(extra["__all__"])
+        person = {
+            "name": self.names[row],
+            "ssn": format_digits(self.ssns[row], SSN_LAYOUT),
+            "phone_number": format_digits(self.phones[row], PHONE_LAYOUT),
+            "address": self.addresses[row],
+            "dob": date.fromordinal(self.dobs[row]).isoformat() if self.dobs[row] > 0 else "",
+            "height": f"{self.heights[row] // 12}'{self.heights[row] % 12}",
+            "race": self.race_values[self.races[row]]
+        }
+        if extra is not None:
+            person.update(extra)
+        return person
+
+    def __setitem__(self, row, person):
+        self.overflow.pop(row, None)
+        packed, extra = self.pack(person)
+        (self.names[row], self.ssns[row], self.phones[row], self.addresses[row],
+         self.dobs[row], self.heights[row], self.races[row]) = packed
+        if extra:
+            self.overflow[row] = extra
+
+    def append(self, person):
+        packed, extra = self.pack(person)
+        if extra:
+            self.overflow[len(self.names)] = extra
+        name, ssn, phone, address, dob, height, race = packed
+        self.names.append(name)
+        self.ssns.append(ssn)
+        self.phones.append(phone)
+        self.addresses.append(address)
+        self.dobs.append(dob)
+        self.heights.append(height)
+        self.races.append(race)
+
+    def pop(self):
+        person = self[-1]
+        self.overflow.pop(len(self.names) - 1, None)
+        for column in (self.names, self.ssns, self.phones, self.addresses, self.dobs, self.heights, self.races):
+            column.pop()
+        return person
+
+    def pack(self, person):
+        """
+        Return the packed column values for a person and a dict of anything that
+        had to be kept as a string.
+        """
+        if person.keys() != FIELD_SET:
+            # Records with a different set of fields are kept whole
+            return ("", 0, 0, "", 0, 0, 0), {"__all__": dict(person)}
+
+        extra = {}
+        ssn = pack_digits(person["ssn"], SSN_LAYOUT)
+        if ssn is None:
+            ssn = MISSING
+            extra["ssn"] = person["ssn"]
+        phone = pack_digits(person["phone_number"], PHONE_LAYOUT)
+        if phone is None:
+            phone = MISSING
+            extra["phone_number"] = person["phone_number"]
+        dob = dob_to_ordinal(person["dob"])
+        if dob is None or date.fromordinal(dob).isoformat() != person["dob"]:
+            dob = MISSING
+            extra["dob"] = person["dob"]
+        height = height_to_inches(person["height"])
+        if height is None or height >= MISSING_HEIGHT or f"{height // 12}'{height % 12}" != person["height"]:
+            height = MISSING_HEIGHT
+            extra["height"] = person["height"]
+
+        race = self.race_codes.get(person["race"])
+        if race is None:
+            race = self.race_codes[person["race"]] = len(self.race_values)
+            self.race_values.append(person["race"])
+
+        return (person["name"], ssn, phone, person["address"], dob, height, race), extra
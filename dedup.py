@@ -0,0 +1,390 @@
+"""
+Report people who are probably the same person entered more than once.
+
+    python dedup.py clusters.csv
+    python dedup.py clusters.jsonl --threshold 0.8 --workers 4
+
+Comparing every pair of people is out of the question for large files, so people are
+first grouped into blocks that share a blocking key: SSN, phone number, date of birth
+plus the start of a first or last name, or house number plus street or ZIP code. Only
+pairs within a block are scored, on several processes, and pairs that score above the
+threshold are joined into clusters. Files ending in .csv get one row per person with
+their cluster number; anything else gets one JSON line per cluster.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+from multiprocessing import Pool
+
+from bulk_import import file_format
+from columnar_store import ColumnarRecords
+from fuzzy import edit_distance, name_words
+from storage import DATA_FILE, StorageError, open_storage
+from validation import PERSON_FIELDS
+
+# Pairs scoring at least this much are reported as likely duplicates
+THRESHOLD = 0.75
+
+# Blocks larger than this (e.g. a placeholder phone number) are skipped rather than scored
+# pair by pair; the other keys of their members still find real duplicates
+MAX_BLOCK = 500
+
+# Letters of a name word that go into the DOB blocking key
+NAME_PREFIX = 3
+
+# Rough number of pairs handed to a worker process at a time
+TASK_PAIRS = 20000
+
+# How much each field counts towards a pair's score, short fields first so that
+# hopeless pairs are given up on before the long name and address are compared
+WEIGHTS = {"ssn": 0.3, "phone_number": 0.15, "dob": 0.15, "name": 0.25, "address": 0.15}
+
+NON_DIGITS = re.compile(r"\D")
+HOUSE_AND_STREET = re.compile(r"^\s*(\d+)\s+([a-z]+)")
+ZIP_CODE = re.compile(r"\b(\d{5})(?:-\d{4})?\s*$")
+
+
+def digits(value):
+    return NON_DIGITS.sub("", value)
+
+
+def ssn_keys(person):
+    ssn = digits(person.get("ssn", ""))
+    return ["s" + ssn] if ssn else []
+
+
+def phone_keys(person):
+    phone = digits(person.get("phone_number", ""))
+    return ["p" + phone] if phone else []
+
+
+def dob_name_keys(person):
+    # One key per end of the name, so a typo in either the first or last name still shares a block
+    dob = person.get("dob", "").strip()
+    words = name_words(person.get("name", ""))
+    if not dob or not words:
+        return []
+    return list({"d" + dob + words[0][:NAME_PREFIX], "d" + dob + words[-1][:NAME_PREFIX]})
+
+
+def address_keys(person):
+    address = person.get("address", "").lower()
+    match = HOUSE_AND_STREET.match(address)
+    if match is None:
+        return []
+    number, street = match.groups()
+    keys = ["a" + number + " " + street]
+    zip_code = ZIP_CODE.search(address)
+    if zip_code is not None:
+        keys.append("a" + number + " " + zip_code.group(1))
+    return keys
+
+
+KEY_FUNCTIONS = (ssn_keys, phone_keys, dob_name_keys, address_keys)
+
+
+def blocking_keys(person):
+    return [key for key_function in KEY_FUNCTIONS for key in key_function(person)]
+
+
+def build_blocks(records, max_block=MAX_BLOCK):
+    """
+    Group record positions by blocking key, one kind of key at a time to limit memory.
+    Returns the blocks with two or more members as (key, positions) pairs, and the set
+    of keys whose blocks were too large to score.
+    """
+    blocks = []
+    oversized = set()
+    for key_function in KEY_FUNCTIONS:
+        members = {}
+        for position in range(len(records)):
+            for key in key_function(records[position]):
+                found = members.get(key)
+                if found is None:
+                    # Most keys are unique, so a bare position saves a list per key
+                    members[key] = position
+                elif isinstance(found, int):
+                    members[key] = [found, position]
+                else:
+                    found.append(position)
+        for key, found in members.items():
+            if isinstance(found, int):
+                continue
+            if len(found) > max_block:
+                oversized.add(key)
+            else:
+                blocks.append((key, found))
+    return blocks, oversized
+
+
+def comparable(person):
+    """The fields of a person the way they are compared."""
+    return {
+        "ssn": digits(person.get("ssn", "")),
+        "name": " ".join(sorted(name_words(person.get("name", "")))),
+        "dob": person.get("dob", "").strip(),
+        "phone_number": digits(person.get("phone_number", "")),
+        "address": " ".join(person.get("address", "").lower().split())
+    }
+
+
+def text_similarity(a, b):
+    """1 for equal strings, falling towards 0 as more edits are needed to turn one into the other."""
+    if a == b:
+        return 1.0
+    longest = max(len(a), len(b))
+    limit = longest // 2
+    distance = edit_distance(a, b, limit)
+    return 0.0 if distance > limit else 1 - distance / longest
+
+
+def digit_similarity(a, b):
+    """
+    Like text_similarity for fixed-length numbers such as SSNs and dates, where a typo
+    changes a digit in place: digits are compared position by position, and two
+    neighbouring digits swapped count as a single edit.
+    """
+    if len(a) != len(b):
+        return text_similarity(a, b)
+    edits = 0
+    position = 0
+    while position < len(a):
+        if a[position] != b[position]:
+            edits += 1
+            if position + 1 < len(a) and a[position] == b[position + 1] and a[position + 1] == b[position]:
+                position += 1
+        position += 1
+    return 0.0 if edits > len(a) // 2 else 1 - edits / len(a)
+
+
+# Fields compared digit by digit rather than by edit distance
+DIGIT_FIELDS = frozenset(("ssn", "phone_number", "dob"))
+
+
+def similarity(a, b, threshold=0.0):
+    """
+    Weighted similarity between 0 and 1 of two people given by comparable().
+    Fields missing on either side are left out rather than counted as a mismatch.
+    Returns 0 as soon as the pair can no longer reach threshold.
+    """
+    present = [(field, weight) for field, weight in WEIGHTS.items() if a[field] and b[field]]
+    weight_used = sum(weight for _, weight in present)
+    if not weight_used:
+        return 0.0
+    total = lost = 0.0
+    for field, weight in present:
+        if field in DIGIT_FIELDS:
+            score = digit_similarity(a[field], b[field])
+        else:
+            score = text_similarity(a[field], b[field])
+        total += weight * score
+        lost += weight * (1 - score)
+        if 1 - lost / weight_used < threshold:
+            return 0.0
+    return total / weight_used
+
+
+# State of a scoring process, set once by init_worker instead of being sent with every task
+worker_records = None
+worker_oversized = None
+worker_threshold = None
+
+
+def init_worker(records, oversized, threshold):
+    global worker_records, worker_oversized, worker_threshold
+    worker_records = records
+    worker_oversized = oversized
+    worker_threshold = threshold
+
+
+def score_blocks(task):
+    """
+    Score every pair within the given blocks and return (pairs compared, matches), where
+    matches are (position, position, score) tuples. A pair sharing several keys is only
+    scored in the block of the smallest key they share, so each pair is compared once.
+    """
+    compared = 0
+    matches = []
+    for key, positions in task:
+        people = [worker_records[position] for position in positions]
+        keys = [set(blocking_keys(person)) - worker_oversized for person in people]
+        fields = [comparable(person) for person in people]
+        for a in range(len(positions)):
+            for b in range(a + 1, len(positions)):
+                if min(keys[a] & keys[b]) != key:
+                    continue
+                compared += 1
+                score = similarity(fields[a], fields[b], worker_threshold)
+                if score >= worker_threshold:
+                    matches.append((positions[a], positions[b], score))
+    return compared, matches
+
+
+def make_tasks(blocks, task_pairs=TASK_PAIRS):
+    tasks = []
+    task = []
+    pairs = 0
+    for key, positions in blocks:
+        task.append((key, positions))
+        pairs += len(positions) * (len(positions) - 1) // 2
+        if pairs >= task_pairs:
+            tasks.append(task)
+            task = []
+            pairs = 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+class DisjointSet:
+    """Union-find over record positions, with path halving and union by size."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size.get(root_a, 1) < self.size.get(root_b, 1):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] = self.size.get(root_a, 1) + self.size.pop(root_b, 1)
+
+    def groups(self):
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
+
+
+class DedupReport:
+    """Clusters of likely duplicates, plus counts of how the work was cut down."""
+
+    def __init__(self):
+        self.people = 0
+        self.blocks = 0
+        self.skipped_blocks = 0
+        self.compared = 0
+        self.matches = []   # (position, position, score)
+        self.clusters = []  # sorted lists of positions, largest cluster first
+
+
+def find_duplicates(records, threshold=THRESHOLD, workers=None, max_block=MAX_BLOCK):
+    """
+    Find clusters of likely duplicate people in records, any sequence of person dicts.
+    Pairs are scored on workers processes (all cores by default).
+    """
+    report = DedupReport()
+    report.people = len(records)
+    blocks, oversized = build_blocks(records, max_block)
+    report.blocks = len(blocks)
+    report.skipped_blocks = len(oversized)
+
+    tasks = make_tasks(blocks)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers, init_worker, (records, oversized, threshold)) as pool:
+            results = list(pool.imap_unordered(score_blocks, tasks))
+    else:
+        init_worker(records, oversized, threshold)
+        results = [score_blocks(task) for task in tasks]
+
+    clusters = DisjointSet()
+    for compared, matches in results:
+        report.compared += compared
+        report.matches.extend(matches)
+        for a, b, _ in matches:
+            clusters.union(a, b)
+    report.matches.sort()
+    report.clusters = sorted((sorted(group) for group in clusters.groups()), key=lambda group: (-len(group), group[0]))
+    return report
+
+
+def load_records(storage):
+    """
+    Read every person in storage, including repeated SSNs the app would set aside,
+    into packed columns so millions of people fit in memory.
+    """
+    records = ColumnarRecords()
+    for batch in storage.stream():
+        for person in batch:
+            records.append(person)
+    return records
+
+
+def export_clusters(f, records, report, fmt):
+    """Write each cluster with its people and the scores that linked them."""
+    cluster_of = {}
+    for number, cluster in enumerate(report.clusters, start=1):
+        for position in cluster:
+            cluster_of[position] = number
+    best_score = {}
+    linked = {}
+    for a, b, score in report.matches:
+        for position in (a, b):
+            best_score[position] = max(best_score.get(position, 0.0), score)
+        linked.setdefault(cluster_of[a], []).append((a, b, score))
+
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(["cluster", "size", "best_score", *PERSON_FIELDS])
+        for number, cluster in enumerate(report.clusters, start=1):
+            for position in cluster:
+                person = records[position]
+                writer.writerow([number, len(cluster), f"{best_score[position]:.3f}",
+                                 *(person.get(field, "") for field in PERSON_FIELDS)])
+        return
+
+    for number, cluster in enumerate(report.clusters, start=1):
+        index_in_cluster = {position: i for i, position in enumerate(cluster)}
+        pairs = [[index_in_cluster[a], index_in_cluster[b], round(score, 3)] for a, b, score in linked[number]]
+        f.write(json.dumps({"cluster": number, "people": [records[position] for position in cluster],
+                            "pairs": pairs}) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find people who were probably entered more than once.")
+    parser.add_argument("destination", help="CSV or JSON-lines file to write the clusters to")
+    parser.add_argument("--data", default=DATA_FILE, help="data file to check")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help=f"lowest score between 0 and 1 counted as a duplicate (default {THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=None, help="processes to score pairs on (default all cores)")
+    parser.add_argument("--max-block", type=int, default=MAX_BLOCK,
+                        help=f"skip blocking keys shared by more people than this (default {MAX_BLOCK})")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.data):
+        parser.error(f"{args.data} does not exist")
+    if not 0 < args.threshold <= 1:
+        parser.error("--threshold must be above 0 and at most 1")
+    try:
+        storage = open_storage(args.data)
+        records = load_records(storage)
+        storage.close()
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+
+    report = find_duplicates(records, args.threshold, args.workers, args.max_block)
+    with open(args.destination, "w", newline="") as f:
+        export_clusters(f, records, report, file_format(args.destination))
+
+    duplicates = sum(len(cluster) for cluster in report.clusters)
+    print(f"Checked {report.people} people: {report.compared} pairs compared in {report.blocks} blocks")
+    if report.skipped_blocks:
+        print(f"Skipped {report.skipped_blocks} blocking keys shared by more than {args.max_block} people")
+    print(f"Found {len(report.clusters)} clusters covering {duplicates} people; written to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""
+Encrypted storage for the people list, split into independently encrypted chunks.
+
+A data file ending in .enc is a directory:
+    manifest                 nonce + AES-GCM encrypted JSON list of (chunk id, generation, count)
+    chunk-<id>-<generation>  magic "IDMCHNK1", count (u32), count x 16-byte SSN tags,
+                             nonce, AES-GCM encrypted JSON list of people
+
+Each chunk holds up to CHUNK_RECORDS people, so adding or removing one person rewrites
+one chunk and the small manifest instead of the whole file, and loading decrypts chunks
+on several threads. The SSN tags are a keyed hash (HMAC-SHA256) of the normalized SSN,
+a blind index that finds the chunk holding an SSN without decrypting anything else.
+Tags are stored in the clear but authenticated together with the chunk they describe.
+
+A changed chunk is written under its next generation number, then the manifest is
+replaced, then the old chunk file is deleted; a crash at any point leaves the
+previous state readable. Chunk ids and generations are part of the authenticated data,
+so chunks cannot be swapped or rolled back without detection. Processes sharing the
+directory take turns through an advisory lock on "<data file>.lock".
+
+The key is 32 random bytes, base64 encoded, read from the IDENTITY_MANAGER_KEY
+environment variable. Needs the cryptography package.
+
+    python encrypted_storage.py new-key
+    python encrypted_storage.py encrypt "Individuals' Data.json" "Individuals' Data.enc"
+    python encrypted_storage.py decrypt "Individuals' Data.enc" "Individuals' Data.json"
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from record_store import normalize_ssn
+from storage import (BATCH_SIZE, LOCK_SUFFIX, ConflictError, FileLock, StorageError, open_storage, read_errors,
+                     write_json_snapshot)
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+KEY_VARIABLE = "IDENTITY_MANAGER_KEY"
+CHUNK_RECORDS = 1000
+MANIFEST = "manifest"
+CHUNK_MAGIC = b"IDMCHNK1"
+MANIFEST_MAGIC = b"IDMMANI1"
+CHUNK_HEADER = struct.Struct("<8sI")
+CHUNK_ID = struct.Struct("<QQ")
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# Chunks decrypted ahead of the reader when streaming, per thread
+READ_AHEAD = 4
+
+
+def new_key():
+    return base64.urlsafe_b64encode(os.urandom(32)).decode("ascii")
+
+
+def key_from_environment():
+    value = os.environ.get(KEY_VARIABLE)
+    if not value:
+        raise StorageError(f"Set {KEY_VARIABLE} to the data key to open encrypted data files.")
+    try:
+        key = base64.urlsafe_b64decode(value)
+    except (binascii.Error, ValueError):
+        key = b""
+    if len(key) != 32:
+        raise StorageError(f"{KEY_VARIABLE} must be 32 bytes, base64 encoded.")
+    return key
+
+
+def derive_key(key, purpose):
+    """Separate keys for encryption and the blind index, so neither can stand in for the other."""
+    return hmac.new(key, b"identity-manager " + purpose, hashlib.sha256).digest()
+
+
+class EncryptedStorage:
+    """
+    Storage in encrypted chunks, with the same load/stream/add/remove/save methods as
+    JournalStorage and a get() that decrypts only the chunk holding the SSN.
+    """
+
+    def __init__(self, path, key=None, chunk_records=CHUNK_RECORDS, workers=None, fsync=True):
+        if AESGCM is None:
+            raise StorageError("Encrypted data files need the cryptography package (pip install cryptography).")
+        key = key_from_environment() if key is None else key
+        self.path = path
+        self.chunk_records = chunk_records
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.fsync = fsync
+        self._cipher = AESGCM(derive_key(key, b"chunk encryption"))
+        self._index_key = derive_key(key, b"ssn blind index")
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + LOCK_SUFFIX)
+        self._chunks = None   # chunk id -> (generation, count), in storage order
+        self._by_tag = {}     # SSN tag -> chunk id
+        self._next_id = 0
+        self._tail = None     # chunk new people go into while it has room
+        self._changes = 0     # commits made to the directory, counted in the manifest
+        self._manifest_stat = None
+        self._check_strays = False
+        # Commit count the last stream or sync brought the caller up to, and the manifest
+        # file as it was then
+        self.version = None
+        self._version_stat = None
+
+    def blind_index(self, ssn):
+        return hmac.new(self._index_key, normalize_ssn(ssn).encode(), hashlib.sha256).digest()[:TAG_SIZE]
+
+    def load(self):
+        return [person for batch in self.stream() for person in batch]
+
+    def stream(self, batch_size=BATCH_SIZE, on_progress=None):
+        """Yield people a chunk at a time, in order, while later chunks decrypt on other threads."""
+        with read_errors(self.path), self._lock, self._file_lock.shared():
+            self._open()
+            self._caught_up()
+            yield from self._stream(on_progress)
+
+    def _stream(self, on_progress):
+        with self._lock:
+            chunks = list(self._chunks.items())
+            with ThreadPoolExecutor(self.workers) as pool:
+                pending = []
+                for done, (chunk_id, (generation, _)) in enumerate(chunks):
+                    pending.append(pool.submit(self._read_chunk, chunk_id, generation))
+                    # Keep a bounded number of chunks in flight so memory stays flat
+                    if len(pending) >= self.workers * READ_AHEAD:
+                        yield pending.pop(0).result()[1]
+                        if on_progress is not None:
+                            on_progress(done / len(chunks))
+                for future in pending:
+                    yield future.result()[1]
+        if on_progress is not None:
+            on_progress(1.0)
+
+    def get(self, ssn):
+        """Return the person with the given SSN, or None."""
+        with self._lock, self._file_lock.shared():
+            self._open()
+            chunk_id = self._by_tag.get(self.blind_index(ssn))
+            if chunk_id is None:
+                return None
+            key = normalize_ssn(ssn)
+            for person in self._read_chunk(chunk_id, self._chunks[chunk_id][0])[1]:
+                if normalize_ssn(str(person.get("ssn", ""))) == key:
+                    return person
+        return None
+
+    def add(self, person, expected_version=None):
+        self.add_many([person], expected_version)
+
+    def add_many(self, records, expected_version=None):
+        """Add people, rewriting only the chunks they land in. Returns how many were written."""
+        with self._writing(expected_version):
+            edits = {}
+            count = 0
+            for person in records:
+                self._place(person, edits)
+                count += 1
+            self._commit(edits)
+        return count
+
+    def remove(self, ssn, expected_version=None):
+        with self._writing(expected_version):
+            tag = self.blind_index(ssn)
+            chunk_id = self._by_tag.get(tag)
+            if chunk_id is None:
+                return
+            key = normalize_ssn(ssn)
+            people = self._read_chunk(chunk_id, self._chunks[chunk_id][0])[1]
+            kept = [person for person in people if normalize_ssn(str(person.get("ssn", ""))) != key]
+            if len(kept) == len(people):
+                return
+            del self._by_tag[tag]
+            self._commit({chunk_id: kept})
+
+    def save(self, records, expected_version=None):
+        """Rewrite everything as new, full chunks, encrypting them on several threads."""
+        with self._writing(expected_version):
+            self._rewrite(records)
+
+    def _rewrite(self, records):
+        with self._lock:
+            old_files = [self._chunk_path(chunk_id, generation) for chunk_id, (generation, _) in self._chunks.items()]
+            people = list(records)
+            batches = [people[start:start + self.chunk_records]
+                       for start in range(0, len(people), self.chunk_records)]
+            first_id = self._next_id
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                with ThreadPoolExecutor(self.workers) as pool:
+                    tags = list(pool.map(self._write_chunk, range(first_id, first_id + len(batches)),
+                                         [1] * len(batches), batches))
+                self._chunks = {}
+                self._by_tag = {}
+                for offset, (batch, batch_tags) in enumerate(zip(batches, tags)):
+                    self._chunks[first_id + offset] = (1, len(batch))
+                    self._by_tag.update(dict.fromkeys(batch_tags, first_id + offset))
+                self._next_id = first_id + len(batches)
+                self._write_manifest()
+                self._committed()
+            except BaseException:
+                self._chunks = None
+                raise
+            self._tail = next(reversed(self._chunks), None)
+            self._remove_files(old_files)
+
+    def compact(self, wait=False):
+        """Repack into full chunks once removals have left most chunks half empty."""
+        with self._writing(None):
+            total = sum(count for _, count in self._chunks.values())
+            needed = -(-total // self.chunk_records)
+            if len(self._chunks) > 2 * needed + 1:
+                self._rewrite([person for batch in self._stream(None) for person in batch])
+
+    def wait_for_compaction(self):
+        pass
+
+    def close(self):
+        self._file_lock.close()
+
+    def changed(self):
+        """
+        Cheap check, without locking, whether another process committed since the last
+        stream or sync. Meant to be polled; call sync() when it returns True.
+        """
+        return self._stat_manifest() != self._version_stat
+
+    def sync(self):
+        """
+        Return [] when nothing changed since the last stream or sync. Other processes'
+        changes are not recorded one by one here, so after them this returns None and
+        the data has to be loaded again.
+        """
+        with self._lock, self._file_lock.shared():
+            self._open()
+            if self.version != self._changes:
+                return None
+            self._caught_up()
+            return []
+
+    @contextmanager
+    def _writing(self, expected_version):
+        """Hold both locks for a change, with the chunk list as the last commit left it."""
+        with self._lock, self._file_lock:
+            self._open()
+            if expected_version is not None and expected_version != self._changes:
+                raise ConflictError("The data was changed by another process since it was last read.")
+            if self._check_strays:
+                # Only safe while no other process can be half way through a commit
+                self._remove_stray_files()
+                self._check_strays = False
+            yield
+
+    def _caught_up(self):
+        self.version = self._changes
+        self._version_stat = self._manifest_stat
+
+    def _committed(self):
+        caught_up = self.version == self._changes
+        self._changes += 1
+        self._manifest_stat = self._stat_manifest()
+        if caught_up:
+            self._caught_up()
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(os.path.join(self.path, MANIFEST))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _open(self):
+        """
+        Read the manifest and the SSN tags of every chunk without decrypting any people;
+        again only when another process replaced the manifest since.
+        """
+        manifest_stat = self._stat_manifest()
+        if self._chunks is not None and manifest_stat == self._manifest_stat:
+            return
+        manifest_path = os.path.join(self.path, MANIFEST)
+        chunks = {}
+        next_id = 0
+        changes = 0
+        if manifest_stat is not None:
+            with open(manifest_path, "rb") as f:
+                data = f.read()
+            manifest = json.loads(self._decrypt(data, MANIFEST_MAGIC, "The manifest"))
+            next_id = manifest["next_id"]
+            changes = manifest.get("changes", 0)
+            for chunk_id, generation, count in manifest["chunks"]:
+                chunks[chunk_id] = (generation, count)
+        elif os.path.isdir(self.path) and any(name.startswith("chunk-") for name in os.listdir(self.path)):
+            raise StorageError(f"{os.path.basename(self.path)} has chunks but no manifest.")
+
+        by_tag = {}
+        for chunk_id, (generation, count) in chunks.items():
+            for tag in self._read_tags(chunk_id, generation, count):
+                by_tag[tag] = chunk_id
+        self._chunks = chunks
+        self._by_tag = by_tag
+        self._next_id = next_id
+        self._tail = next(reversed(chunks), None)
+        self._changes = changes
+        self._manifest_stat = manifest_stat
+        self._check_strays = True
+
+    def _place(self, person, edits):
+        tag = self.blind_index(person["ssn"])
+        chunk_id = self._by_tag.get(tag)
+        if chunk_id is not None:
+            # As with the journal, adding an SSN that is already stored replaces that person
+            people = self._edited(chunk_id, edits)
+            key = normalize_ssn(person["ssn"])
+            for position, other in enumerate(people):
+                if normalize_ssn(str(other.get("ssn", ""))) == key:
+                    people[position] = person
+                    return
+            people.append(person)
+            return
+        if self._tail is None or len(self._edited(self._tail, edits)) >= self.chunk_records:
+            self._tail = self._next_id
+            self._next_id += 1
+            edits[self._tail] = []
+        self._edited(self._tail, edits).append(person)
+        self._by_tag[tag] = self._tail
+
+    def _edited(self, chunk_id, edits):
+        people = edits.get(chunk_id)
+        if people is None:
+            people = edits[chunk_id] = self._read_chunk(chunk_id, self._chunks[chunk_id][0])[1]
+        return people
+
+    def _commit(self, edits):
+        """Write the changed chunks under new generations, then the manifest, then drop the old files."""
+        if not edits:
+            return
+        old_files = []
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            for chunk_id, people in edits.items():
+                generation = 0
+                if chunk_id in self._chunks:
+                    generation = self._chunks[chunk_id][0]
+                    old_files.append(self._chunk_path(chunk_id, generation))
+                if people:
+                    self._write_chunk(chunk_id, generation + 1, people)
+                    self._chunks[chunk_id] = (generation + 1, len(people))
+                else:
+                    self._chunks.pop(chunk_id, None)
+            self._write_manifest()
+            self._committed()
+        except BaseException:
+            # Forget what was changed in memory; the next call reads the files again
+            self._chunks = None
+            raise
+        if self._tail not in self._chunks:
+            self._tail = next(reversed(self._chunks), None)
+        self._remove_files(old_files)
+
+    def _chunk_path(self, chunk_id, generation):
+        return os.path.join(self.path, f"chunk-{chunk_id:06d}-{generation}")
+
+    def _read_tags(self, chunk_id, generation, count):
+        try:
+            with open(self._chunk_path(chunk_id, generation), "rb") as f:
+                header = f.read(CHUNK_HEADER.size + TAG_SIZE * count)
+        except FileNotFoundError:
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is missing.") from None
+        if len(header) != CHUNK_HEADER.size + TAG_SIZE * count or CHUNK_HEADER.unpack_from(header) != (CHUNK_MAGIC, count):
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is damaged.")
+        tags = header[CHUNK_HEADER.size:]
+        return [tags[start:start + TAG_SIZE] for start in range(0, len(tags), TAG_SIZE)]
+
+    def _read_chunk(self, chunk_id, generation):
+        """Return (SSN tags, people) of a chunk, checking it was not altered or swapped."""
+        try:
+            with open(self._chunk_path(chunk_id, generation), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is missing.") from None
+        if len(data) < CHUNK_HEADER.size:
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is damaged.")
+        magic, count = CHUNK_HEADER.unpack_from(data)
+        header_end = CHUNK_HEADER.size + TAG_SIZE * count
+        header = data[:header_end]
+        if magic != CHUNK_MAGIC:
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is damaged.")
+        people = json.loads(self._decrypt(data[header_end:], header + CHUNK_ID.pack(chunk_id, generation),
+                                          f"Chunk {chunk_id}"))
+        if len(people) != count:
+            raise StorageError(f"Chunk {chunk_id} of {os.path.basename(self.path)} is damaged.")
+        tags = header[CHUNK_HEADER.size:]
+        return [tags[start:start + TAG_SIZE] for start in range(0, len(tags), TAG_SIZE)], people
+
+    def _write_chunk(self, chunk_id, generation, people):
+        """Encrypt and write one chunk; returns its SSN tags."""
+        tags = [self.blind_index(str(person.get("ssn", ""))) for person in people]
+        header = CHUNK_HEADER.pack(CHUNK_MAGIC, len(people)) + b"".join(tags)
+        nonce = os.urandom(NONCE_SIZE)
+        data = json.dumps(people).encode("utf-8")
+        ciphertext = self._cipher.encrypt(nonce, data, header + CHUNK_ID.pack(chunk_id, generation))
+        self._write_file(self._chunk_path(chunk_id, generation), header + nonce + ciphertext)
+        return tags
+
+    def _write_manifest(self):
+        manifest = {"version": 1, "next_id": self._next_id, "changes": self._changes + 1,
+                    "chunks": [[chunk_id, generation, count] for chunk_id, (generation, count) in self._chunks.items()]}
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = self._cipher.encrypt(nonce, json.dumps(manifest).encode("utf-8"), MANIFEST_MAGIC)
+        path = os.path.join(self.path, MANIFEST)
+        self._write_file(path + ".tmp", nonce + ciphertext)
+        os.replace(path + ".tmp", path)
+
+    def _write_file(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _decrypt(self, data, associated, what):
+        try:
+            return self._cipher.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], associated)
+        except (InvalidTag, ValueError):
+            raise StorageError(f"{what} of {os.path.basename(self.path)} could not be decrypted: "
+                               "the key is wrong or the file was altered.") from None
+
+    def _remove_files(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_stray_files(self):
+        # Left behind by a crash between writing new chunks and replacing the manifest
+        if not os.path.isdir(self.path):
+            return
+        current = {os.path.basename(self._chunk_path(chunk_id, generation))
+                   for chunk_id, (generation, _) in self._chunks.items()}
+        stray = [os.path.join(self.path, name) for name in os.listdir(self.path)
+                 if (name.startswith("chunk-") and name not in current) or name == MANIFEST + ".tmp"]
+        self._remove_files(stray)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage encrypted data files for the Identity Manager.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("new-key", help=f"print a new random key to put in {KEY_VARIABLE}")
+    encrypt_parser = subparsers.add_parser("encrypt", help="copy a JSON, binary or SQLite data file into a .enc one")
+    encrypt_parser.add_argument("source")
+    encrypt_parser.add_argument("destination")
+    decrypt_parser = subparsers.add_parser("decrypt", help="write the people in a .enc data file to a JSON file")
+    decrypt_parser.add_argument("source")
+    decrypt_parser.add_argument("destination")
+    args = parser.parse_args(argv)
+
+    if args.command == "new-key":
+        print(new_key())
+        return
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    try:
+        if args.command == "encrypt":
+            EncryptedStorage(args.destination).save(open_storage(args.source).load())
+        else:
+            write_json_snapshot(args.destination, EncryptedStorage(args.source).load())
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import re
+
+# Largest edit distance a fuzzy name search tolerates per word by default
+MAX_DISTANCE = 2
+
+SOUNDEX_CODES = {}
+for letters, digit in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = digit
+
+VOWELS = frozenset("AEIOU")
+FRONT_VOWELS = frozenset("EIY")
+
+
+def name_words(name):
+    """Split a name into lowercase words, ignoring punctuation."""
+    return re.findall(r"[a-z]+", name.lower())
+
+
+def soundex(word):
+    """American Soundex code of a word, e.g. Robert -> R163."""
+    word = "".join(letter for letter in word.upper() if letter.isalpha() and letter.isascii())
+    if not word:
+        return ""
+    code = word[0]
+    previous = SOUNDEX_CODES.get(word[0], "")
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code; vowels do
+        if letter not in "HW":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def metaphone(word):
+    """
+    Original Metaphone code of a word (Lawrence Philips, 1990), e.g. Knight -> NT.
+    Coarser than Soundex about vowels but better at English spelling rules like PH, GH and silent letters.
+    """
+    word = "".join(letter for letter in word.upper() if letter.isalpha() and letter.isascii())
+    if not word:
+        return ""
+    if word[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        word = word[1:]
+    if word[0] == "X":
+        word = "S" + word[1:]
+    elif word[:2] == "WH":
+        word = "W" + word[2:]
+
+    code = []
+    length = len(word)
+    for i, letter in enumerate(word):
+        previous = word[i - 1] if i > 0 else ""
+        following = word[i + 1] if i + 1 < length else ""
+        after_next = word[i + 2] if i + 2 < length else ""
+        if letter == previous and letter != "C":
+            continue
+        if letter in VOWELS:
+            if i == 0:
+                code.append(letter)
+        elif letter == "B":
+            if not (previous == "M" and i == length - 1):
+                code.append("B")
+        elif letter == "C":
+            if following == "I" and after_next == "A":
+                code.append("X")
+            elif following == "H":
+                code.append("K" if previous == "S" else "X")
+            elif following in FRONT_VOWELS:
+                if previous != "S":
+                    code.append("S")
+            else:
+                code.append("K")
+        elif letter == "D":
+            if following == "G" and after_next in FRONT_VOWELS:
+                code.append("J")
+            else:
+                code.append("T")
+        elif letter == "G":
+            if following == "H" and not (i + 2 >= length or after_next in VOWELS):
+                continue
+            if following == "N" and (i + 2 == length or word[i + 1:] == "NED"):
+                continue
+            if following in FRONT_VOWELS and previous != "G":
+                code.append("J")
+            else:
+                code.append("K")
+        elif letter == "H":
+            if previous in "CSPTG" and previous:
+                continue
+            if previous in VOWELS and following not in VOWELS:
+                continue
+            code.append("H")
+        elif letter == "K":
+            if previous != "C":
+                code.append("K")
+        elif letter == "P":
+            code.append("F" if following == "H" else "P")
+        elif letter == "Q":
+            code.append("K")
+        elif letter == "S":
+            if following == "H" or (following == "I" and after_next in ("O", "A")):
+                code.append("X")
+            else:
+                code.append("S")
+        elif letter == "T":
+            if following == "I" and after_next in ("O", "A"):
+                code.append("X")
+            elif following == "H":
+                code.append("0")
+            elif not (following == "C" and after_next == "H"):
+                code.append("T")
+        elif letter == "V":
+            code.append("F")
+        elif letter in "WY":
+            if following in VOWELS:
+                code.append(letter)
+        elif letter == "X":
+            code.append("KS")
+        elif letter == "Z":
+            code.append("S")
+        else:
+            code.append(letter)
+    return "".join(code)
+
+
+def edit_distance(a, b, limit=None):
+    """
+    Levenshtein distance between two strings. With a limit, gives up early and
+    returns limit + 1 as soon as the distance is known to exceed it.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over words under edit distance. A search for words within
+    distance d of a query only visits the children whose edge label is within d of the
+    distance to their parent, which skips most of the vocabulary.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Return (distance, word) pairs for every word within max_distance."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class FuzzyNameIndex:
+    """
+    Index of name words for misspelling-tolerant name searches. Each word maps to the
+    SSN keys of people with that word in their name; words are also indexed by their
+    Soundex and Metaphone codes and kept in a BK-tree for bounded edit-distance lookups.
+    """
+
+    def __init__(self):
+        self.people = {}    # word -> set of SSN keys
+        self.phonetic = {}  # phonetic code -> set of words
+        self.tree = BKTree()
+
+    def insert(self, key, person):
+        for word in name_words(person.get("name", "")):
+            keys = self.people.get(word)
+            if keys is None:
+                keys = self.people[word] = set()
+                self.tree.add(word)
+                for code in (soundex(word), "M" + metaphone(word)):
+                    self.phonetic.setdefault(code, set()).add(word)
+            keys.add(key)
+
+    def delete(self, key, person):
+        # Words stay in the BK-tree and phonetic lists; they are skipped once nobody uses them
+        for word in name_words(person.get("name", "")):
+            keys = self.people.get(word)
+            if keys is not None:
+                keys.discard(key)
+
+    def similar_words(self, word, max_distance):
+        """Return {indexed word: similarity between 0 and 1} for words close to word."""
+        similar = {}
+        longest = max(len(word), 1)
+        for distance, candidate in self.tree.search(word, max_distance):
+            similar[candidate] = 1 - distance / max(longest, len(candidate))
+        for code in (soundex(word), "M" + metaphone(word)):
+            for candidate in self.phonetic.get(code, ()):
+                if candidate not in similar:
+                    # Sounds alike but is spelled further apart: rank below close spellings
+                    distance = edit_distance(word, candidate)
+                    similar[candidate] = 0.5 * (1 - distance / max(longest, len(candidate)))
+        return similar
+
+    def search(self, records, name, max_distance=MAX_DISTANCE):
+        """
+        Return (similarity, person) pairs, best first, for people whose name has a close
+        match for every word of the query.
+        """
+        query = name_words(name)
+        if not query:
+            return []
+        per_word = []
+        for word in query:
+            similar = self.similar_words(word, max_distance)
+            keys = set()
+            for candidate in similar:
+                keys |= self.people.get(candidate, set())
+            if not keys:
+                return []
+            per_word.append((keys, similar))
+
+        per_word.sort(key=lambda entry: len(entry[0]))
+        matched = set(per_word[0][0])
+        for keys, _ in per_word[1:]:
+            matched &= keys
+
+        ranked = []
+        for key in matched:
+            person = records.get(key)
+            if person is None:
+                continue
+            words = name_words(person.get("name", ""))
+            score = sum(max(similar.get(word, 0.0) for word in words) for _, similar in per_word) / len(per_word)
+            ranked.append((score, person))
+        ranked.sort(key=lambda entry: (-entry[0], entry[1].get("name", "")))
+        return ranked
@@ -0,0 +1,35 @@
+from collections import namedtuple
+
+from aggregates import Aggregates
+from columnar_store import ColumnarRecords
+from fuzzy import FuzzyNameIndex
+from ordered_index import OrderedIndex, dob_key, height_key
+from record_store import RecordStore
+from search import ResultCache
+from trigram_index import TrigramIndex
+
+# Fields kept sorted by an OrderedIndex, for range searches and sorting those columns
+SORT_KEYS = {"dob": dob_key, "height": height_key}
+
+# A RecordStore and the indexes attached to it; an index that was not asked for is None
+# (ordered_indexes is then empty)
+IndexedStore = namedtuple("IndexedStore", ["data", "search_index", "name_index", "ordered_indexes",
+                                           "search_cache", "aggregates"])
+
+
+def build_indexed_store(records, trigram=True, fuzzy=True, ordered=True, cache=True, aggregates=True,
+                        compact=False):
+    """
+    Load records into a fresh RecordStore and attach the indexes the app searches with.
+    With compact, the people are kept in packed columns (ColumnarRecords) instead of dicts.
+    """
+    data = RecordStore(records, backing=ColumnarRecords() if compact else None)
+    search_index = data.attach(TrigramIndex()) if trigram else None
+    name_index = data.attach(FuzzyNameIndex()) if fuzzy else None
+    ordered_indexes = {}
+    if ordered:
+        for field, key_function in SORT_KEYS.items():
+            ordered_indexes[field] = data.attach(OrderedIndex(key_function))
+    search_cache = data.attach(ResultCache()) if cache else None
+    totals = data.attach(Aggregates()) if aggregates else None
+    return IndexedStore(data, search_index, name_index, ordered_indexes, search_cache, totals)
@@ -0,0 +1,136 @@
+import re
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from datetime import date
+
+from record_store import dob_to_ordinal, height_to_inches
+
+# Sort key for values that cannot be parsed; sorts before every real date or height
+UNPARSED = -1
+
+RANGE_PATTERN = re.compile(r"^(>=|<=|>|<)\s*(.*)$|^(.*?)\s*\.\.\s*(.*)$")
+
+
+def dob_key(person):
+    value = dob_to_ordinal(person.get("dob", ""))
+    return UNPARSED if value is None else value
+
+
+def height_key(person):
+    value = height_to_inches(person.get("height", ""))
+    return UNPARSED if value is None else value
+
+
+def dob_bounds(text):
+    """
+    Return the first and last day number covered by YYYY, YYYY-MM or YYYY-MM-DD.
+    """
+    parts = text.split("-")
+    if not all(part.isdigit() for part in parts) or len(parts) > 3 or len(parts[0]) != 4:
+        raise ValueError(f"'{text}' is not a year, YYYY-MM or YYYY-MM-DD.")
+    year = int(parts[0])
+    try:
+        if len(parts) == 1:
+            return date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+        month = int(parts[1])
+        if len(parts) == 2:
+            return date(year, month, 1).toordinal(), date(year, month, monthrange(year, month)[1]).toordinal()
+        day = date(year, month, int(parts[2])).toordinal()
+        return day, day
+    except ValueError:
+        raise ValueError(f"'{text}' is not a real date.") from None
+
+
+def height_bounds(text):
+    """
+    Return the shortest and tallest height in inches covered by X'Y, or by X for a whole foot.
+    """
+    feet, sep, inches = text.rstrip("\"").partition("'")
+    if not feet.isdigit() or (inches and not inches.isdigit()):
+        raise ValueError(f"'{text}' is not a height like 5'11 or 6.")
+    if inches:
+        value = int(feet) * 12 + int(inches)
+        return value, value
+    return int(feet) * 12, int(feet) * 12 + 11
+
+
+class OrderedIndex:
+    """
+    Sorted list of (sort key, SSN key) pairs for one field, searched with bisect.
+    Answers range queries and gives a ready-made sort order for the field.
+
+    Inserts are buffered and merged in one sort the next time the order is needed,
+    so loading a large file costs one O(n log n) sort instead of n list insertions.
+    """
+
+    def __init__(self, key_function):
+        self.key_function = key_function
+        self._sorted = []
+        self._pending = []
+
+    def __len__(self):
+        return len(self._sorted) + len(self._pending)
+
+    @property
+    def entries(self):
+        """The sorted entries. The same list object is kept and updated in place."""
+        if self._pending:
+            # Timsort finds the sorted run already there, so this is close to a merge
+            self._sorted.extend(self._pending)
+            self._sorted.sort()
+            self._pending = []
+        return self._sorted
+
+    def insert(self, key, person):
+        self._pending.append((self.key_function(person), key))
+
+    def delete(self, key, person):
+        entry = (self.key_function(person), key)
+        entries = self.entries
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def span(self, low, high):
+        """Return the (start, end) slice of entries with low <= sort key <= high."""
+        entries = self.entries
+        # (low,) sorts before every entry with that sort key and (high, "\uffff") after
+        start = bisect_left(entries, (max(low, 0),))
+        end = bisect_right(entries, (high, "\uffff"))
+        return start, max(start, end)
+
+
+# Fields that accept range queries, with how to read them and how to parse a bound
+RANGE_FIELDS = {
+    "dob": (dob_key, dob_bounds),
+    "height": (height_key, height_bounds),
+}
+
+NO_LIMIT = 1 << 62
+
+
+def parse_range(field, text):
+    """
+    Parse a range query such as 1970..1980, >=6'0 or <1950-06 for a field in RANGE_FIELDS.
+    Returns inclusive (low, high) sort keys, None when text is not a range query,
+    and raises ValueError when it looks like one but a bound is invalid.
+    """
+    if field not in RANGE_FIELDS:
+        return None
+    match = RANGE_PATTERN.match(text.strip())
+    if match is None:
+        return None
+    bounds = RANGE_FIELDS[field][1]
+    operator, value, start, end = match.groups()
+    if operator is not None:
+        low, high = bounds(value.strip())
+        if operator == ">":
+            return high + 1, NO_LIMIT
+        if operator == ">=":
+            return low, NO_LIMIT
+        if operator == "<":
+            return 0, low - 1
+        return 0, high
+    low = bounds(start)[0] if start else 0
+    high = bounds(end.strip())[1] if end.strip() else NO_LIMIT
+    return low, high
@@ -0,0 +1,108 @@
+"""
+Opt-in timing spans for user actions in the Identity Manager.
+
+Set IDENTITY_MANAGER_PROFILE to a file path before starting the app to record one JSON
+line per span (name, start time, seconds, details), and get a per-action summary on
+stderr when the app exits. When the variable is not set, spans cost one attribute check.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_VARIABLE = "IDENTITY_MANAGER_PROFILE"
+
+PROFILE_PATH = os.environ.get(PROFILE_VARIABLE) or None
+ENABLED = PROFILE_PATH is not None
+
+_lock = threading.Lock()
+_file = None
+_durations = {}  # span name -> list of seconds
+
+
+class Span:
+    """A running timing span; stop() records it. Stopping twice records it once."""
+
+    def __init__(self, name, details):
+        self.name = name
+        self.details = details
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.stopped = False
+
+    def stop(self, **details):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.details.update(details)
+        record(self.name, self.wall_start, time.perf_counter() - self.start, self.details)
+
+
+class NullSpan:
+    def stop(self, **details):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def start(name, **details):
+    """Start a span that ends later, e.g. in a root.after callback. Call stop() on the result."""
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, details)
+
+
+@contextmanager
+def span(name, **details):
+    """Time the body of a with block."""
+    running = start(name, **details)
+    try:
+        yield running
+    finally:
+        running.stop()
+
+
+def profiled(name):
+    """Decorator that times every call of a function as a span."""
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name, wall_start, seconds, details):
+    global _file
+    line = json.dumps({"span": name, "start": round(wall_start, 6), "seconds": round(seconds, 6), **details})
+    with _lock:
+        if _file is None:
+            _file = open(PROFILE_PATH, "a")
+            atexit.register(write_summary)
+        _file.write(line + "\n")
+        _file.flush()
+        _durations.setdefault(name, []).append(seconds)
+
+
+def write_summary(stream=None):
+    """Print count, median, 99th percentile and worst time per span name."""
+    stream = sys.stderr if stream is None else stream
+    with _lock:
+        if not _durations:
+            return
+        print(f"Timing spans recorded in {PROFILE_PATH}:", file=stream)
+        for name, samples in sorted(_durations.items()):
+            ordered = sorted(samples)
+            p50 = ordered[len(ordered) // 2]
+            p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+            print(f"  {name:24s} {len(ordered):6d} x  p50 {p50 * 1000:9.1f} ms  p99 {p99 * 1000:9.1f} ms  "
+                  f"max {ordered[-1] * 1000:9.1f} ms", file=stream)
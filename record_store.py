@@ -0,0 +1,133 @@
+from datetime import date
+
+
+class DuplicateRecordError(Exception):
+    """Raised when adding a person whose SSN is already in the store."""
+
+
+def normalize_ssn(ssn):
+    """Strip dashes and spaces so '123-45-6789' and '123456789' are the same key."""
+    return ssn.replace("-", "").replace(" ", "")
+
+
+def normalize_phone(phone):
+    """Strip dashes and spaces so '555-123-4567' and '5551234567' are the same key."""
+    return phone.replace("-", "").replace(" ", "")
+
+
+def dob_to_ordinal(dob):
+    """Return a YYYY-MM-DD date as a day number, or None if it is not a real date."""
+    try:
+        return date.fromisoformat(dob).toordinal()
+    except ValueError:
+        return None
+
+
+def height_to_inches(height):
+    """Return an X'Y height as a number of inches, or None if it is not in that format."""
+    feet, sep, inches = height.partition("'")
+    if not sep or not feet.isdigit() or not inches.isdigit():
+        return None
+    return int(feet) * 12 + int(inches)
+
+
+class RecordStore:
+    """
+    In-memory list of people with hash indexes on SSN and phone number.
+    Adds, removes and exact lookups take constant time regardless of size.
+    """
+
+    def __init__(self, records=(), backing=None):
+        # Any list-like sequence can hold the records, e.g. a compact ColumnarRecords
+        self._records = [] if backing is None else backing
+        self._by_ssn = {}    # normalized SSN -> position in _records
+        self._by_phone = {}  # normalized phone -> set of normalized SSNs
+        self._indexes = []
+        # Records from disk whose SSN was already loaded; they stay on disk but not in memory
+        self.duplicates = []
+        self.extend(records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, position):
+        return self._records[position]
+
+    def __contains__(self, ssn):
+        return normalize_ssn(ssn) in self._by_ssn
+
+    def get(self, ssn):
+        """Return the person with the given SSN, or None."""
+        position = self._by_ssn.get(normalize_ssn(ssn))
+        return None if position is None else self._records[position]
+
+    def find_by_phone(self, phone):
+        """Return everyone listed under the given phone number."""
+        keys = self._by_phone.get(normalize_phone(phone), ())
+        return [self._records[self._by_ssn[key]] for key in keys]
+
+    def add(self, person):
+        key = normalize_ssn(person["ssn"])
+        if key in self._by_ssn:
+            raise DuplicateRecordError(person["ssn"])
+        self._by_ssn[key] = len(self._records)
+        self._records.append(person)
+        self._by_phone.setdefault(normalize_phone(person.get("phone_number", "")), set()).add(key)
+        for index in self._indexes:
+            index.insert(key, person)
+
+    def extend(self, records):
+        """Add records loaded from disk, setting aside any whose SSN is already present."""
+        for person in records:
+            try:
+                self.add(person)
+            except DuplicateRecordError:
+                self.duplicates.append(person)
+
+    def remove(self, ssn):
+        """
+        Remove and return the person with the given SSN, or None if there is none.
+        The last record is moved into the freed slot so removal never shifts the list.
+        """
+        key = normalize_ssn(ssn)
+        position = self._by_ssn.pop(key, None)
+        if position is None:
+            return None
+        person = self._records[position]
+        last = self._records.pop()
+        if position < len(self._records):
+            self._records[position] = last
+            self._by_ssn[normalize_ssn(last["ssn"])] = position
+        phone = normalize_phone(person.get("phone_number", ""))
+        same_phone = self._by_phone[phone]
+        same_phone.discard(key)
+        if not same_phone:
+            del self._by_phone[phone]
+        for index in self._indexes:
+            index.delete(key, person)
+        return person
+
+    def apply_changes(self, changes):
+        """Apply journal operations another process wrote, as returned by storage.sync()."""
+        for change in changes:
+            if change["op"] == "add":
+                # The journal replaces a person whose SSN is added again
+                person = change["record"]
+                if person["ssn"] in self:
+                    self.remove(person["ssn"])
+                self.add(person)
+            elif change["ssn"] in self:
+                self.remove(change["ssn"])
+
+    def attach(self, index):
+        """
+        Keep a secondary index up to date. The index needs insert(key, person) and
+        delete(key, person) methods, where key is the normalized SSN.
+        """
+        for person in self._records:
+            index.insert(normalize_ssn(person["ssn"]), person)
+        self._indexes.append(index)
+        return index
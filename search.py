@@ -0,0 +1,238 @@
+import queue
+import threading
+from collections import OrderedDict
+
+from ordered_index import RANGE_FIELDS, UNPARSED, parse_range
+
+# People checked by a SearchJob between handing results over and checking for cancellation
+SEARCH_CHUNK = 5000
+
+# Searches whose results a ResultCache keeps, and the most results it keeps for one search
+CACHE_SIZE = 32
+CACHE_MAX_RESULTS = 100000
+
+
+def normalize_value(key, value):
+    """
+    Put a field value in the form searches compare against:
+    lowercase, and for SSNs without dashes.
+    """
+    value = value.lower()
+    if key == "ssn":
+        value = value.replace("-", "")
+    return value
+
+
+def normalize_criteria(criteria):
+    """Drop empty criteria and normalize the rest once per query rather than once per person."""
+    return {key: normalize_value(key, value) for key, value in criteria.items() if value}
+
+
+def matches(person, terms):
+    """Check whether every normalized search term is a substring of the person's field."""
+    for key, term in terms.items():
+        if term not in normalize_value(key, person.get(key, "")):
+            return False
+    return True
+
+
+def split_criteria(criteria):
+    """
+    Separate range queries on DOB and height (e.g. 1970..1980, >6'0) from the
+    substring criteria, normalizing the latter. Raises ValueError for a bad range.
+    """
+    terms = {}
+    ranges = {}
+    for key, value in criteria.items():
+        if not value:
+            continue
+        bounds = parse_range(key, value)
+        if bounds is None:
+            terms[key] = normalize_value(key, value)
+        else:
+            ranges[key] = bounds
+    return terms, ranges
+
+
+def in_ranges(person, ranges):
+    """Check whether the person's DOB and height fall inside every requested range."""
+    for key, (low, high) in ranges.items():
+        value = RANGE_FIELDS[key][0](person)
+        if value == UNPARSED or not low <= value <= high:
+            return False
+    return True
+
+
+def find_candidates(terms, ranges, index=None, ordered=None):
+    """
+    Return the SSN keys worth checking, taken from whichever index gives the fewest,
+    or None when every person has to be checked.
+    """
+    candidates = index.candidates(terms) if index is not None else None
+    for key, (low, high) in ranges.items():
+        ordered_index = ordered.get(key) if ordered else None
+        if ordered_index is None:
+            continue
+        start, end = ordered_index.span(low, high)
+        if candidates is None or end - start < len(candidates):
+            candidates = [ssn_key for _, ssn_key in ordered_index.entries[start:end]]
+    return candidates
+
+
+def search(records, criteria, index=None, ordered=None):
+    """
+    Return the people matching all of the given criteria.
+    With indexes (a TrigramIndex and a dict of field -> OrderedIndex), only the
+    candidates they return get the full check.
+    """
+    terms, ranges = split_criteria(criteria)
+    candidates = find_candidates(terms, ranges, index, ordered)
+    if candidates is None:
+        return [person for person in records if matches(person, terms) and in_ranges(person, ranges)]
+    results = []
+    for key in candidates:
+        person = records.get(key)
+        if person is not None and matches(person, terms) and in_ranges(person, ranges):
+            results.append(person)
+    return results
+
+
+class SearchJob:
+    """
+    Runs a search on a worker thread and hands matches over in chunks, so the GUI
+    stays responsive and can show results while the rest of the data is scanned.
+    """
+
+    def __init__(self, records, criteria, index=None, ordered=None, chunk_size=SEARCH_CHUNK):
+        self.records = records
+        self.terms, self.ranges = split_criteria(criteria)
+        # Candidates are taken on the calling thread, which is the one that updates the indexes
+        candidates = find_candidates(self.terms, self.ranges, index, ordered)
+        self.candidates = None if candidates is None else list(candidates)
+        self.chunk_size = chunk_size
+        self.checked = 0
+        self.failed = False
+        self.found = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        # The end marker is always posted, so whoever polls the job stops even if the search fails
+        try:
+            batch = []
+            for person in self.people():
+                if matches(person, self.terms) and in_ranges(person, self.ranges):
+                    batch.append(person)
+                self.checked += 1
+                if self.checked % self.chunk_size == 0:
+                    if self.cancelled.is_set():
+                        return
+                    if batch:
+                        self.found.put(batch)
+                        batch = []
+            if batch:
+                self.found.put(batch)
+        except Exception:
+            self.failed = True
+            raise
+        finally:
+            self.found.put(None)
+
+    def people(self):
+        if self.candidates is not None:
+            for key in self.candidates:
+                try:
+                    person = self.records.get(key)
+                except IndexError:
+                    # Removed while we looked it up, as in the walk by position below
+                    continue
+                if person is not None:
+                    yield person
+            return
+        # Walk by position so people appended while the search runs are still included
+        position = 0
+        while position < len(self.records):
+            try:
+                yield self.records[position]
+            except IndexError:
+                return
+            position += 1
+
+    def drain(self, results):
+        """Move the matches found so far into results; return True once the search has finished."""
+        while True:
+            try:
+                batch = self.found.get_nowait()
+            except queue.Empty:
+                return False
+            if batch is None:
+                return True
+            results.extend(batch)
+
+
+class ResultCache:
+    """
+    Results of recent searches, dropping the least recently used first. Attached to the
+    RecordStore like an index, so any add or remove empties it.
+    """
+
+    def __init__(self, size=CACHE_SIZE, max_results=CACHE_MAX_RESULTS):
+        self.size = size
+        self.max_results = max_results
+        self._entries = OrderedDict()  # (terms, ranges) -> list of people
+        # Goes up whenever the cache is emptied, so a search that was running during an
+        # add or remove can tell its results are not worth keeping
+        self.generation = 0
+
+    @staticmethod
+    def key(terms, ranges):
+        return tuple(sorted(terms.items())), tuple(sorted(ranges.items()))
+
+    def get(self, terms, ranges):
+        """Return the cached results of a search (from split_criteria), or None."""
+        key = self.key(terms, ranges)
+        results = self._entries.get(key)
+        if results is not None:
+            self._entries.move_to_end(key)
+        return results
+
+    def put(self, terms, ranges, results):
+        if len(results) > self.max_results:
+            return
+        key = self.key(terms, ranges)
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def narrowest(self, terms, ranges):
+        """
+        Return the shortest cached result list that includes every match of this search,
+        or None. That holds for a search with the same ranges where each cached term is a
+        substring of the new term for the field, e.g. after typing more characters.
+        """
+        ranges = tuple(sorted(ranges.items()))
+        best = None
+        for (cached_terms, cached_ranges), results in self._entries.items():
+            if cached_ranges != ranges or (best is not None and len(results) >= len(best)):
+                continue
+            if all(term in terms.get(key, "") for key, term in cached_terms):
+                best = results
+        return best
+
+    def clear(self):
+        if self._entries:
+            self._entries.clear()
+        self.generation += 1
+
+    def insert(self, key, person):
+        self.clear()
+
+    def delete(self, key, person):
+        self.clear()
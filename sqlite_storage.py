@@ -0,0 +1,304 @@
+"""
+SQLite storage for the people list, with indexed lookups and searches run as SQL.
+
+Import an existing JSON data file (snapshot plus journal) with:
+    python sqlite_storage.py migrate "Individuals' Data.json" "Individuals' Data.sqlite"
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from record_store import DuplicateRecordError, normalize_ssn
+from storage import BATCH_SIZE, ConflictError, StorageError, open_storage
+from validation import PERSON_FIELDS
+
+FIELD_SET = frozenset(PERSON_FIELDS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    ssn_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    ssn TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    address TEXT NOT NULL,
+    dob TEXT NOT NULL,
+    height TEXT NOT NULL,
+    race TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS people_phone ON people (phone_number);
+CREATE INDEX IF NOT EXISTS people_name ON people (name);
+CREATE INDEX IF NOT EXISTS people_dob ON people (dob);
+"""
+
+INSERT = ("INSERT INTO people (ssn_key, name, ssn, phone_number, address, dob, height, race, extra) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+SELECT = "SELECT name, ssn, phone_number, address, dob, height, race, extra FROM people"
+
+# The app only stores phone numbers as XXX-XXX-XXXX and dates as YYYY-MM-DD, so a search
+# term of the full length can only match by equality, which the indexes can answer
+EXACT_LENGTHS = {"phone_number": 12, "dob": 10}
+
+
+def person_to_row(person):
+    extra = {key: value for key, value in person.items() if key not in FIELD_SET}
+    return (
+        normalize_ssn(person["ssn"]),
+        *(str(person.get(field, "")) for field in PERSON_FIELDS),
+        json.dumps(extra) if extra else None
+    )
+
+
+def row_to_person(row):
+    person = dict(zip(PERSON_FIELDS, row[:7]))
+    if row[7]:
+        person.update(json.loads(row[7]))
+    return person
+
+
+def criteria_to_sql(terms):
+    """
+    Turn normalized search terms (see search.normalize_criteria) into a WHERE clause
+    and its parameters, keeping the same substring rules as the in-memory search.
+    """
+    clauses = []
+    params = []
+    for key, term in terms.items():
+        if key not in FIELD_SET:
+            continue
+        if key == "ssn":
+            # Likewise SSNs are always stored as XXX-XX-XXXX, i.e. a 9-digit key
+            if len(term) == 9 and term.isdigit():
+                clauses.append("ssn_key = ?")
+            else:
+                clauses.append("instr(replace(lower(ssn), '-', ''), ?) > 0")
+        elif EXACT_LENGTHS.get(key) == len(term):
+            clauses.append(f"{key} = ?")
+        else:
+            clauses.append(f"instr(lower({key}), ?) > 0")
+        params.append(term)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SQLiteStorage:
+    """
+    Storage backed by an SQLite database in WAL mode. It offers the same
+    load/stream/add/remove/save methods as JournalStorage, plus get() and find()
+    that answer queries without loading every person.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # PRAGMA data_version as of the last load, stream or sync. SQLite does its own
+        # locking between processes; data_version changes when another connection commits.
+        self.version = None
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        except sqlite3.DatabaseError as e:
+            raise StorageError(f"{os.path.basename(path)} could not be opened ({e}).") from e
+
+    def load(self):
+        with self._read_errors(), self._lock:
+            self.version = self._data_version()
+            return [row_to_person(row) for row in self._db.execute(SELECT + " ORDER BY id")]
+
+    def stream(self, batch_size=BATCH_SIZE, on_progress=None):
+        with self._read_errors():
+            with self._lock:
+                self.version = self._data_version()
+                total = self._db.execute("SELECT count(*) FROM people").fetchone()[0] or 1
+            last_id = 0
+            done = 0
+            while True:
+                # Page by id so the lock is only held for one batch at a time
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT id, name, ssn, phone_number, address, dob, height, race, extra FROM people "
+                        "WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                    ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                done += len(rows)
+                yield [row_to_person(row[1:]) for row in rows]
+                if on_progress is not None:
+                    on_progress(min(1.0, done / total))
+
+    def add(self, person, expected_version=None):
+        with self._lock, self._writing(expected_version):
+            try:
+                self._db.execute(INSERT, person_to_row(person))
+            except sqlite3.IntegrityError as e:
+                raise DuplicateRecordError(person["ssn"]) from e
+
+    def add_many(self, records, batch_size=BATCH_SIZE, skip_duplicates=False, expected_version=None):
+        """
+        Insert records in transactions of batch_size rows each and return how many were added.
+        With skip_duplicates, people whose SSN is already stored are left out instead of
+        raising DuplicateRecordError. expected_version is checked before the first batch.
+        """
+        if expected_version is not None:
+            with self._lock:
+                self._check_version(expected_version)
+        sql = INSERT.replace("INSERT", "INSERT OR IGNORE", 1) if skip_duplicates else INSERT
+        added = 0
+        batch = []
+        for person in records:
+            batch.append(person_to_row(person))
+            if len(batch) >= batch_size:
+                added += self._insert_batch(sql, batch)
+                batch = []
+        if batch:
+            added += self._insert_batch(sql, batch)
+        return added
+
+    def remove(self, ssn, expected_version=None):
+        with self._lock, self._writing(expected_version):
+            self._db.execute("DELETE FROM people WHERE ssn_key = ?", (normalize_ssn(ssn),))
+
+    def save(self, records, expected_version=None):
+        with self._lock, self._writing(expected_version):
+            self._db.execute("DELETE FROM people")
+            self._db.executemany(INSERT, (person_to_row(person) for person in records))
+
+    def changed(self):
+        """Whether another connection committed since the last load, stream or sync."""
+        with self._lock:
+            return self._data_version() != self.version
+
+    def sync(self):
+        """
+        Return [] when nothing changed since the last load, stream or sync. SQLite keeps
+        no log of other connections' changes, so after them this returns None and the
+        data has to be loaded again.
+        """
+        return [] if not self.changed() else None
+
+    def get(self, ssn):
+        """Return the person with the given SSN, or None."""
+        with self._lock:
+            row = self._db.execute(SELECT + " WHERE ssn_key = ?", (normalize_ssn(ssn),)).fetchone()
+        return None if row is None else row_to_person(row)
+
+    def find_by_phone(self, phone):
+        with self._lock:
+            rows = self._db.execute(SELECT + " WHERE phone_number = ? ORDER BY id", (phone,)).fetchall()
+        return [row_to_person(row) for row in rows]
+
+    def find(self, terms, limit=None, offset=0):
+        """
+        Return the people matching normalized search terms, in the order they were added.
+        """
+        where, params = criteria_to_sql(terms)
+        sql = SELECT + where + " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [limit, offset]
+        with self._lock:
+            return [row_to_person(row) for row in self._db.execute(sql, params)]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM people").fetchone()[0]
+
+    def compact(self, wait=False):
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def wait_for_compaction(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @contextmanager
+    def _read_errors(self):
+        """Report a damaged or unreadable database as StorageError, like the other backends."""
+        try:
+            yield
+        except (sqlite3.DatabaseError, ValueError) as e:
+            raise StorageError(f"{os.path.basename(self.path)} could not be read ({e}).") from e
+
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_version(self, expected_version):
+        if expected_version is not None and self._data_version() != expected_version:
+            raise ConflictError("The data was changed by another process since it was last read.")
+
+    @contextmanager
+    def _writing(self, expected_version):
+        """A write transaction, taken before expected_version is checked so no one can commit in between."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._check_version(expected_version)
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _insert_batch(self, sql, rows):
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(sql, rows)
+            except sqlite3.IntegrityError as e:
+                self._db.execute("ROLLBACK")
+                raise DuplicateRecordError(str(e)) from e
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return self._db.total_changes - before
+
+
+def migrate(source, destination):
+    """
+    Copy every person from a JSON or binary data file (journal included) into an SQLite database.
+    As when the app loads a file, only the first person with a given SSN is kept.
+    Returns the number of people copied and the number skipped as duplicates.
+    """
+    database = SQLiteStorage(destination)
+    copied = skipped = 0
+    try:
+        for batch in open_storage(source).stream():
+            added = database.add_many(batch, skip_duplicates=True)
+            copied += added
+            skipped += len(batch) - added
+    finally:
+        database.close()
+    return copied, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage SQLite data files for the Identity Manager.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="import a JSON or binary data file")
+    migrate_parser.add_argument("source")
+    migrate_parser.add_argument("destination")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    try:
+        copied, skipped = migrate(args.source, args.destination)
+    except StorageError as e:
+        parser.exit(1, f"error: {e}\n")
+    print(f"Copied {copied} people into {args.destination}")
+    if skipped:
+        print(f"Skipped {skipped} people whose SSN was already copied")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from json.encoder import encode_basestring_ascii
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from validation import PERSON_FIELDS
+
+# Every add/remove is appended to "<data file>.journal" as one JSON line. When the
+# journal gets long it is renamed to "<data file>.journal.compacting" and folded into
+# the snapshot on a background thread, so the snapshot is never rewritten in the GUI thread.
+# The last folded journal is kept as "<data file>.journal.folded" for other processes
+# that have not caught up with it yet.
+JOURNAL_SUFFIX = ".journal"
+COMPACTING_SUFFIX = ".journal.compacting"
+FOLDED_SUFFIX = ".journal.folded"
+COMPACT_EVERY = 1000
+BATCH_SIZE = 5000
+READ_SIZE = 1 << 20
+
+# Several processes can share one data file. Writers hold an exclusive advisory lock on
+# "<data file>.lock", which also holds the number of changes made so far; every journal
+# line carries its change number, so other processes can catch up from the journal.
+LOCK_SUFFIX = ".lock"
+SNAPSHOT_LOCK_SUFFIX = ".snapshot.lock"
+VERSION_WIDTH = 20
+LOCK_RETRY_SECONDS = 0.05
+
+# The person fields as encode_record writes them, encoded once
+ENCODED_FIELDS = {field: encode_basestring_ascii(field) + ": " for field in PERSON_FIELDS}
+
+
+# Function to get the correct base directory in both development and packaged executable environments
+def get_base_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+BASE_DIR = get_base_dir()
+# The data file the app and the command-line tools use unless told otherwise
+DATA_FILE = os.path.join(BASE_DIR, "Individuals' Data.json")
+
+
+class StorageError(Exception):
+    """Raised when the data on disk cannot be read without losing records."""
+
+
+class ConflictError(StorageError):
+    """Raised when another process changed the data since the version a write expected."""
+
+
+class FileLock:
+    """
+    A lock shared by the threads of this process and, through an advisory lock on a
+    small file, by other processes. Used as "with lock:" for exclusive access or
+    "with lock.shared():" for reading. The file's content is free for the owner to use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._acquire(exclusive=True)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+    @contextmanager
+    def shared(self):
+        # msvcrt only has exclusive locks, so readers on Windows take turns
+        self._acquire(exclusive=fcntl is None)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def read(self):
+        """The text in the lock file; only meaningful while the lock is held."""
+        self._file.seek(0)
+        return self._file.read().decode("ascii", "replace")
+
+    def write(self, text, fsync=False):
+        """Replace the text in the lock file; call with the lock held exclusively."""
+        self._file.seek(0)
+        self._file.write(text.encode("ascii"))
+        self._file.truncate()
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _acquire(self, exclusive):
+        self._thread_lock.acquire()
+        try:
+            if self._file is None:
+                self._file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), "r+b")
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                # msvcrt.locking gives up after about 10 seconds; keep waiting instead
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(LOCK_RETRY_SECONDS)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def _release(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+
+@contextmanager
+def read_errors(path):
+    """Turn the ways reading a data file can fail (bad encoding, I/O errors) into StorageError."""
+    name = os.path.basename(path)
+    try:
+        yield
+    except UnicodeDecodeError as e:
+        raise StorageError(f"{name} is not valid UTF-8 text ({e.reason}).") from e
+    except OSError as e:
+        raise StorageError(f"{name} could not be read ({e.strerror or e}).") from e
+
+
+def parse_version(text):
+    """The change number stored in a lock file; an empty or unreadable one counts as 0."""
+    text = text.strip()
+    return int(text) if text.isdigit() else 0
+
+
+def format_version(version):
+    # Fixed width, so the file never has to shrink and a reader never sees half a number
+    return f"{version:0{VERSION_WIDTH}d}"
+
+
+def read_json_snapshot(path):
+    """
+    Read the list of people from a JSON snapshot file.
+    A missing file is an empty dataset; an unreadable one raises StorageError.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise StorageError(f"{os.path.basename(path)} is damaged ({e}).") from e
+    if not isinstance(data, list):
+        raise StorageError(f"{os.path.basename(path)} does not contain a list of people.")
+    return data
+
+
+def iter_json_snapshot(path, on_progress=None):
+    """
+    Yield the people in a JSON snapshot one at a time without reading the whole file.
+    on_progress, if given, is called with the fraction of the file read so far.
+    """
+    if not os.path.exists(path):
+        return
+    name = os.path.basename(path)
+    total = os.path.getsize(path) or 1
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        expect = "["
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            if on_progress is not None:
+                on_progress(min(1.0, f.tell() / total))
+
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    if expect == "[":
+                        return
+                    raise StorageError(f"{name} ends before the list of people is closed.")
+                fill()
+                continue
+
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise StorageError(f"{name} does not contain a list of people.")
+                pos += 1
+                expect = "first"
+            elif expect == "," and char == ",":
+                pos += 1
+                expect = "person"
+            elif expect in (",", "first") and char == "]":
+                return
+            elif expect in ("first", "person") and char == "{":
+                try:
+                    person, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise StorageError(f"{name} is damaged ({e}).") from e
+                    # The record continues in the next chunk
+                    fill()
+                    continue
+                pos = end
+                expect = ","
+                yield person
+            else:
+                raise StorageError(f"{name} is damaged near character {f.tell() - len(buffer) + pos}.")
+
+
+def encode_record(record):
+    """
+    The same JSON text as json.dumps(record). A person whose keys and values are all
+    strings, as nearly everyone's are, is put together from json's C string encoder,
+    which takes about a third of the time of json.dumps.
+    """
+    try:
+        return "{" + ", ".join([(ENCODED_FIELDS.get(key) or encode_basestring_ascii(key) + ": ")
+                                + encode_basestring_ascii(value) for key, value in record.items()]) + "}"
+    except TypeError:
+        return json.dumps(record)
+
+
+def encode_op(op):
+    """One journal line, without the newline; adds go through encode_record."""
+    if op["op"] == "add" and len(op) == 3 and isinstance(op["v"], int):
+        return '{"op": "add", "record": ' + encode_record(op["record"]) + ', "v": ' + str(op["v"]) + "}"
+    return json.dumps(op)
+
+
+def write_json_snapshot(path, records):
+    """
+    Atomically replace the snapshot with the given records.
+    The file is written next to the target and swapped in with os.replace,
+    so a crash part-way through leaves the previous snapshot untouched.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        # One record per line keeps the file readable and lets json use its C encoder
+        f.write("[")
+        first = True
+        for record in records:
+            f.write("\n    " if first else ",\n    ")
+            f.write(encode_record(record))
+            first = False
+        f.write("\n]\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_journal(path, truncate_torn_tail=False):
+    """
+    Read the operations recorded in a journal file.
+    A final line cut off by a crash is ignored (and optionally truncated away);
+    damage anywhere else raises StorageError.
+    """
+    if not os.path.exists(path):
+        return []
+    ops = []
+    good_size = 0
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    for idx, line in enumerate(lines):
+        is_last = idx == len(lines) - 1
+        try:
+            if not line.endswith(b"\n"):
+                raise ValueError("incomplete line")
+            op = json.loads(line)
+            if op.get("op") not in ("add", "remove"):
+                raise ValueError("unknown operation")
+        except ValueError as e:
+            if is_last:
+                break
+            raise StorageError(f"{os.path.basename(path)} is damaged at line {idx + 1} ({e}).") from e
+        ops.append(op)
+        good_size += len(line)
+    if truncate_torn_tail and good_size < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_size)
+    return ops
+
+
+def replay(ops, pending=None):
+    """
+    Fold journal operations into a dict of SSN -> final record (None when removed).
+    Operations only set or delete a key, so replaying them twice gives the same result.
+    """
+    if pending is None:
+        pending = {}
+    for op in ops:
+        if op["op"] == "add":
+            record = op["record"]
+            pending.pop(record["ssn"], None)
+            pending[record["ssn"]] = record
+        else:
+            pending.pop(op["ssn"], None)
+            pending[op["ssn"]] = None
+    return pending
+
+
+def apply_pending(snapshot, pending):
+    """Combine snapshot records with replayed journal changes."""
+    records = [person for person in snapshot if person.get("ssn") not in pending]
+    records.extend(person for person in pending.values() if person is not None)
+    return records
+
+
+# How a snapshot file is read in full, read incrementally, and written
+SnapshotFormat = namedtuple("SnapshotFormat", ["read", "iterate", "write"])
+JSON_SNAPSHOT = SnapshotFormat(read_json_snapshot, iter_json_snapshot, write_json_snapshot)
+
+
+def open_storage(path):
+    """
+    Return the storage for a data file, choosing the snapshot format from its extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        return JournalStorage(path)
+    if extension == ".idb":
+        from binary_snapshot import BINARY_SNAPSHOT
+        return JournalStorage(path, snapshot_format=BINARY_SNAPSHOT)
+    if extension in (".sqlite", ".db"):
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(path)
+    if extension == ".enc":
+        from encrypted_storage import EncryptedStorage
+        return EncryptedStorage(path)
+    raise StorageError(f"Unsupported data file type: {extension or os.path.basename(path)}")
+
+
+class JournalStorage:
+    """
+    Append-only storage for the people list: a snapshot file plus a journal of changes.
+    Safe to share between processes: see FileLock and sync().
+    """
+
+    def __init__(self, path, compact_every=COMPACT_EVERY, fsync=True, snapshot_format=JSON_SNAPSHOT):
+        self.path = path
+        self.snapshot_format = snapshot_format
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.compacting_path = path + COMPACTING_SUFFIX
+        self.folded_path = path + FOLDED_SUFFIX
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._entries = 0
+        self._lock = FileLock(path + LOCK_SUFFIX)                    # guards the active journal
+        self._snapshot_lock = FileLock(path + SNAPSHOT_LOCK_SUFFIX)  # guards snapshot + compacting file
+        self._compactor = None
+        # Change number the last load or sync brought this process up to (None before
+        # the first load), and later changes this process wrote itself
+        self.version = None
+        self._own = set()
+
+    def load(self):
+        """
+        Return every person on disk: the snapshot with the journals replayed on top.
+        """
+        with read_errors(self.path), self._snapshot_lock.shared(), self._lock.shared():
+            snapshot = self.snapshot_format.read(self.path)
+            pending = self._read_pending()
+            self._caught_up(parse_version(self._lock.read()))
+        return apply_pending(snapshot, pending)
+
+    def stream(self, batch_size=BATCH_SIZE, on_progress=None):
+        """
+        Yield the same people as load() in lists of up to batch_size, parsing the
+        snapshot incrementally. Meant to be run on a background thread.
+        """
+        with read_errors(self.path), self._snapshot_lock.shared():
+            with self._lock.shared():
+                pending = self._read_pending()
+                self._caught_up(parse_version(self._lock.read()))
+            batch = []
+            for person in self.snapshot_format.iterate(self.path, on_progress):
+                if person.get("ssn") not in pending:
+                    batch.append(person)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        # People added through the journal come last, as they do in load()
+        batch.extend(person for person in pending.values() if person is not None)
+        if batch:
+            yield batch
+
+    def add(self, person, expected_version=None):
+        """
+        Record a new person. With expected_version, raise ConflictError instead if
+        the data is no longer at that version (another process changed it).
+        """
+        self._append({"op": "add", "record": person}, expected_version=expected_version)
+
+    def add_many(self, records, expected_version=None):
+        """Append a batch of people to the journal with a single write and fsync."""
+        ops = [{"op": "add", "record": person} for person in records]
+        if ops:
+            self._append(*ops, expected_version=expected_version)
+        return len(ops)
+
+    def remove(self, ssn, expected_version=None):
+        self._append({"op": "remove", "ssn": ssn}, expected_version=expected_version)
+
+    def save(self, records, expected_version=None):
+        """
+        Rewrite the snapshot with the full list and start a fresh journal.
+        """
+        self.wait_for_compaction()
+        with self._snapshot_lock, self._lock:
+            version = parse_version(self._lock.read())
+            self._check_version(version, expected_version)
+            self.snapshot_format.write(self.path, records)
+            for path in (self.journal_path, self.compacting_path, self.folded_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._entries = 0
+            # No journal lines for this change: other processes see a gap and load again
+            self._lock.write(format_version(version + 1), self.fsync)
+            self.version = version + 1
+            self._own.clear()
+
+    def changed(self):
+        """
+        Cheap check, without locking, whether another process changed the data since
+        the last load or sync. Meant to be polled; call sync() when it returns True.
+        """
+        try:
+            with open(self._lock.path, "rb") as f:
+                version = parse_version(f.read(VERSION_WIDTH).decode("ascii", "replace"))
+        except OSError:
+            return False
+        return version != self.version
+
+    def sync(self):
+        """
+        Return the journal operations other processes wrote since the last load or sync,
+        oldest first, and count this process as caught up with them. Returns None when
+        the changes cannot be read back from the journals (the file was saved whole, or
+        compacted twice before this process looked) and the data has to be loaded again.
+        """
+        if self.version is None:
+            return None
+        with self._lock.shared():
+            version = parse_version(self._lock.read())
+            if version == self.version:
+                return []
+            found = {}
+            # The compacting file can become the folded one while we read, not the reverse
+            for path in (self.compacting_path, self.folded_path, self.journal_path):
+                try:
+                    ops = read_journal(path)
+                except FileNotFoundError:
+                    continue
+                for op in ops:
+                    number = op.get("v")
+                    if isinstance(number, int) and self.version < number <= version and number not in self._own:
+                        found[number] = op
+        if any(number not in found and number not in self._own for number in range(self.version + 1, version + 1)):
+            return None
+        self._caught_up(version)
+        return [found[number] for number in sorted(found)]
+
+    def compact(self, wait=False):
+        """
+        Fold the journal into the snapshot on a background thread.
+        """
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            # A leftover compacting file means an earlier compaction never finished
+            # (or another process is running one); finish that one first and leave the
+            # active journal alone.
+            if not os.path.exists(self.compacting_path):
+                if self._entries == 0 or not os.path.exists(self.journal_path):
+                    return
+                os.replace(self.journal_path, self.compacting_path)
+                self._entries = 0
+            self._compactor = threading.Thread(target=self._compact_worker, daemon=True)
+            self._compactor.start()
+        if wait:
+            self.wait_for_compaction()
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def close(self):
+        self.wait_for_compaction()
+        self._lock.close()
+        self._snapshot_lock.close()
+
+    def _compact_worker(self):
+        with self._snapshot_lock:
+            # Another process sharing the file may have folded it already
+            if not os.path.exists(self.compacting_path):
+                return
+            snapshot = self.snapshot_format.read(self.path)
+            pending = replay(read_journal(self.compacting_path))
+            self.snapshot_format.write(self.path, apply_pending(snapshot, pending))
+            os.replace(self.compacting_path, self.folded_path)
+
+    def _read_pending(self):
+        pending = replay(read_journal(self.compacting_path))
+        ops = read_journal(self.journal_path, truncate_torn_tail=True)
+        self._entries = len(ops)
+        return replay(ops, pending)
+
+    def _caught_up(self, version):
+        self.version = version
+        self._own = {number for number in self._own if number > version}
+
+    def _check_version(self, version, expected_version):
+        if expected_version is not None and version != expected_version:
+            raise ConflictError("The data was changed by another process since it was last read.")
+
+    def _append(self, *ops, expected_version=None):
+        with self._lock:
+            version = parse_version(self._lock.read())
+            self._check_version(version, expected_version)
+            first = version + 1
+            for op in ops:
+                version += 1
+                op["v"] = version
+            text = "".join([encode_op(op) + "\n" for op in ops])
+            # The number goes up before the lines are written: a crash in between only
+            # leaves a gap, which makes other processes load again
+            self._lock.write(format_version(version), self.fsync)
+            # Opened per write, so another process can rename the journal in between
+            with open(self.journal_path, "a") as journal:
+                journal.write(text)
+                journal.flush()
+                if self.fsync:
+                    os.fsync(journal.fileno())
+            if self.version is not None:
+                if self.version == first - 1:
+                    self._caught_up(version)
+                else:
+                    self._own.update(range(first, version + 1))
+            self._entries += len(ops)
+            should_compact = self._entries >= self.compact_every
+        if should_compact:
+            self.compact()
@@ -0,0 +1,65 @@
+from search import normalize_value
+
+# Fields covered by the trigram index; the others are short enough to scan
+INDEXED_FIELDS = ("name", "address", "phone_number", "ssn")
+
+
+def trigrams(text):
+    """Return the set of three-character substrings of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from (field, trigram) to the SSN keys of the people containing it.
+    Any substring of three or more characters shares all of its trigrams with
+    the field it came from, so intersecting posting lists narrows a search
+    without missing matches.
+    """
+
+    def __init__(self, fields=INDEXED_FIELDS):
+        self.fields = fields
+        self.postings = {}
+
+    def insert(self, key, person):
+        for field in self.fields:
+            for gram in trigrams(normalize_value(field, person.get(field, ""))):
+                posting = self.postings.get((field, gram))
+                if posting is None:
+                    self.postings[(field, gram)] = posting = set()
+                posting.add(key)
+
+    def delete(self, key, person):
+        for field in self.fields:
+            for gram in trigrams(normalize_value(field, person.get(field, ""))):
+                posting = self.postings.get((field, gram))
+                if posting is not None:
+                    posting.discard(key)
+                    if not posting:
+                        del self.postings[(field, gram)]
+
+    def candidates(self, terms):
+        """
+        Return the set of SSN keys that may match the normalized search terms,
+        or None when no term is long enough to use the index.
+        """
+        lists = []
+        for field, term in terms.items():
+            if field not in self.fields or len(term) < 3:
+                continue
+            for gram in trigrams(term):
+                posting = self.postings.get((field, gram))
+                if posting is None:
+                    return set()
+                lists.append(posting)
+        if not lists:
+            return None
+
+        # Intersect the most selective posting lists first so the working set stays small
+        lists.sort(key=len)
+        result = set(lists[0])
+        for posting in lists[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
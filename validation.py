@@ -0,0 +1,174 @@
+import re
+from collections import namedtuple
+
+# Fields every person has, in the order the forms show them
+PERSON_FIELDS = ("name", "ssn", "phone_number", "address", "dob", "height", "race")
+
+# Patterns are compiled once here instead of being looked up in re's cache on every call
+PHONE_PATTERN = re.compile(r"^\d{3}-\d{3}-\d{4}$")
+SSN_CHARACTERS = re.compile(r"^[0-9 -]+$")
+DOB_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+HEIGHT_PATTERN = re.compile(r"^\d{1,2}'\d{1,2}$")
+INPUT_PATTERNS = {
+    (True, True): re.compile(r"^[A-Za-z0-9 \-,']+$"),
+    (True, False): re.compile(r"^[A-Za-z0-9 \-,]+$"),   # Allow commas, no apostrophes
+    (False, True): re.compile(r"^[A-Za-z0-9 \-']+$"),   # Allow apostrophes and hyphens
+    (False, False): re.compile(r"^[A-Za-z0-9 \-]+$"),   # Only letters, numbers, spaces, hyphens
+}
+
+REQUIRED_MESSAGE = "All fields are required."
+
+
+class ValidationError(ValueError):
+    """Raised with a user-facing message when a person's details are not valid."""
+
+
+def is_valid_phone_number(phone):
+    """
+    Check if the phone number is valid (in the format XXX-XXX-XXXX).
+    """
+    return PHONE_PATTERN.match(phone) is not None
+
+def is_valid_input(text, allow_commas=False, allow_apostrophe=False):
+    """
+    Check if the text contains only valid characters:
+    - No special characters
+    - Allow spaces, hyphens, and apostrophes (only for name and race).
+    """
+    return INPUT_PATTERNS[allow_commas, allow_apostrophe].match(text) is not None
+
+
+def auto_format_ssn(ssn):
+    """
+    Automatically format a 9-digit SSN into XXX-XX-XXXX format.
+    """
+    ssn_clean = ssn.replace(" ", "").replace("-", "")
+    if len(ssn_clean) == 9 and ssn_clean.isdigit():
+        return f"{ssn_clean[:3]}-{ssn_clean[3:5]}-{ssn_clean[5:]}"
+    return ssn
+
+def is_valid_ssn(ssn):
+    return SSN_CHARACTERS.match(ssn) is not None
+
+
+def format_phone_number(phone):
+    """
+    Format a 10-digit phone number as XXX-XXX-XXXX, ignoring spaces and dashes.
+    Returns None if it does not have exactly 10 digits.
+    """
+    phone = phone.replace(" ", "").replace("-", "")
+    if len(phone) == 10 and phone.isdigit():
+        return f"{phone[:3]}-{phone[3:6]}-{phone[6:]}"
+    return None
+
+
+def has_ssn_length(ssn):
+    return len(ssn) == 11
+
+
+def is_formatted(value):
+    return value is not None
+
+
+# One check on one field. normalize, if given, rewrites the field before it is checked
+# and the rewritten value is what gets stored. Rules run in order and the first failure
+# is the message the user sees, matching the order of the Add a Person checks.
+Rule = namedtuple("Rule", ["name", "field", "check", "message", "normalize"], defaults=[None])
+
+RULES = (
+    Rule("ssn_characters", "ssn", SSN_CHARACTERS.match,
+         "Invalid SSN. Only digits, spaces, and dashes are allowed."),
+    Rule("ssn_format", "ssn", has_ssn_length,
+         "Invalid SSN format. Use XXX-XX-XXXX or provide 9 digits.", auto_format_ssn),
+    Rule("phone_format", "phone_number", is_formatted,
+         "Invalid Phone Number format. Use XXX-XXX-XXXX or provide 10 digits.", format_phone_number),
+    Rule("dob_format", "dob", DOB_PATTERN.match,
+         "Invalid Date of Birth format. Use YYYY-MM-DD."),
+    Rule("height_format", "height", HEIGHT_PATTERN.match,
+         "Invalid Height format. Use X'Y\" (e.g., 5'11)."),
+    Rule("address_characters", "address", INPUT_PATTERNS[True, False].match,
+         "Invalid characters in Address."),
+    Rule("name_characters", "name", INPUT_PATTERNS[False, False].match,
+         "Invalid characters in Name. No special characters allowed."),
+    Rule("race_characters", "race", INPUT_PATTERNS[False, False].match,
+         "Invalid characters in Race. No special characters allowed."),
+    Rule("height_characters", "height", INPUT_PATTERNS[False, True].match,
+         "Invalid characters in Height."),
+)
+
+
+def validate_person(person):
+    """
+    Check a person's details and return them with the SSN and phone number formatted.
+    Raises ValidationError with the message to show for the first problem found.
+    """
+    person = {field: person.get(field, "") for field in PERSON_FIELDS}
+
+    # Validate all fields
+    if not all(person.values()):
+        raise ValidationError(REQUIRED_MESSAGE)
+
+    for rule in RULES:
+        value = person[rule.field]
+        if rule.normalize is not None:
+            value = person[rule.field] = rule.normalize(value)
+        if not rule.check(value):
+            raise ValidationError(rule.message)
+    return person
+
+
+class ColumnReport:
+    """
+    Result of validating whole columns at once.
+
+    columns holds the normalized values, masks maps "required" and each rule name to a
+    list that is True where that check failed, and valid is True for rows that passed everything.
+    """
+
+    def __init__(self, columns, masks, valid):
+        self.columns = columns
+        self.masks = masks
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.valid)
+
+    def person(self, row):
+        return {field: self.columns[field][row] for field in PERSON_FIELDS}
+
+    def first_error(self, row):
+        """The message validate_person would raise for this row, or None if it is valid."""
+        if self.valid[row]:
+            return None
+        if self.masks["required"][row]:
+            return REQUIRED_MESSAGE
+        for rule in RULES:
+            if self.masks[rule.name][row]:
+                return rule.message
+        return None
+
+
+def validate_columns(columns):
+    """
+    Validate many people at once, given as a dict of field name -> list of values.
+    Each check runs over a whole column with map(), which avoids per-person
+    function calls and branching. Returns a ColumnReport with per-check error masks.
+    """
+    size = max((len(values) for values in columns.values()), default=0)
+    normalized = {field: list(columns.get(field) or [""] * size) for field in PERSON_FIELDS}
+    required = [False] * size
+    for field in PERSON_FIELDS:
+        values = normalized[field]
+        if len(values) != size:
+            raise ValueError(f"Column {field} has {len(values)} values, expected {size}.")
+        required = [missing or not value for missing, value in zip(required, values)]
+
+    masks = {"required": required}
+    for rule in RULES:
+        values = normalized[rule.field]
+        if rule.normalize is not None:
+            values = normalized[rule.field] = list(map(rule.normalize, values))
+        masks[rule.name] = [not result for result in map(rule.check, values)]
+
+    valid = [not any(failed) for failed in zip(*masks.values())] if size else []
+    return ColumnReport(normalized, masks, valid)
@@ -0,0 +1,125 @@
+import tkinter as tk
+from tkinter import ttk
+
+DEFAULT_ROW_HEIGHT = 20
+WHEEL_ROWS = 3
+SORT_MARKERS = {False: " \u25b2", True: " \u25bc"}
+
+
+class OrderedRows:
+    """
+    Rows shown in a different order without copying them: order lists positions
+    (or index entries) and get turns one into a row. Reversing the view is free.
+    """
+
+    def __init__(self, order, get, reverse=False):
+        self.order = order
+        self.get = get
+        self.reverse = reverse
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, position):
+        if self.reverse:
+            position = len(self.order) - 1 - position
+        return self.get(self.order[position])
+
+
+class VirtualTable:
+    """
+    A Treeview that only holds items for the rows currently on screen.
+    Rows come from any sequence supporting len() and indexing; scrolling
+    reuses the same Treeview items and just swaps in the values for the new window.
+    """
+
+    def __init__(self, parent, columns, rows, row_values, on_sort=None):
+        self.columns = columns
+        self.rows = rows
+        self.row_values = row_values
+        self.offset = 0
+        self.items = []
+
+        self.frame = ttk.Frame(parent)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", height=1)
+        for col in columns:
+            if on_sort is None:
+                self.tree.heading(col, text=col)
+            else:
+                self.tree.heading(col, text=col, command=lambda col=col: on_sort(col))
+            self.tree.column(col, width=100, anchor=tk.W)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        style = ttk.Style()
+        self.row_height = int(style.lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.offset - WHEEL_ROWS) or "break")
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.offset + WHEEL_ROWS) or "break")
+        self.tree.bind("<Prior>", lambda e: self.scroll_to(self.offset - len(self.items)) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll_to(self.offset + len(self.items)) or "break")
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0) or "break")
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.rows)) or "break")
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def set_rows(self, rows):
+        """Show a different sequence of rows, keeping the scroll position where possible."""
+        self.rows = rows
+        self.scroll_to(self.offset)
+
+    def show_sort(self, column, descending):
+        """Mark the heading of the column the rows are sorted by."""
+        for col in self.columns:
+            self.tree.heading(col, text=col + (SORT_MARKERS[descending] if col == column else ""))
+
+    def refresh(self):
+        """Redraw the visible window, e.g. after rows were appended to the sequence."""
+        self.scroll_to(self.offset)
+
+    def on_resize(self, event):
+        # One item per row that fits, plus one for the partly visible row at the bottom
+        wanted = max(1, event.height // self.row_height)
+        while len(self.items) < wanted:
+            self.items.append(self.tree.insert("", tk.END, values=()))
+        while len(self.items) > wanted:
+            self.tree.delete(self.items.pop())
+        self.scroll_to(self.offset)
+
+    def on_mousewheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small integers
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_to(self.offset - steps * WHEEL_ROWS)
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        elif unit == tk.PAGES:
+            self.scroll_to(self.offset + int(amount) * len(self.items))
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def scroll_to(self, offset):
+        total = len(self.rows)
+        # The last full row should sit at the bottom of the window, not the top
+        visible = max(1, len(self.items) - 1)
+        self.offset = max(0, min(offset, total - visible))
+        self.tree.selection_remove(self.tree.selection())
+        empty = ("",) * len(self.columns)
+        for idx, item in enumerate(self.items):
+            row = self.offset + idx
+            self.tree.item(item, values=self.row_values(self.rows[row]) if row < total else empty)
+        self.tree.yview_moveto(0)
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)